@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Local album-art cache with resized thumbnails
+
+Each cover is downloaded from Spotify's CDN once and stored on disk in
+the few sizes the UI asks for, so pages load a small local thumbnail
+instead of the 640 px original from a third-party host. With Pillow
+installed the thumbnails are resized locally from the largest image;
+without it the closest size Spotify itself provides is stored. The cache
+directory is kept under a total byte budget, evicting least recently used
+files first.
+"""
+
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+import spotify_api
+from file_utils import atomic_write_bytes
+
+try:
+    from PIL import Image
+except ImportError:  # resizing is optional; Spotify's own sizes are used instead
+    Image = None
+
+DEFAULT_CACHE_DIR = os.getenv('ALBUM_ART_CACHE_DIR', '.album_art_cache')
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+# Sizes (px) served; requests are rounded up to the next one
+THUMBNAIL_SIZES = (64, 192, 384, 640)
+JPEG_QUALITY = 85
+
+ALBUM_ID = re.compile(r'^[A-Za-z0-9]{1,64}$')
+
+
+def snap_size(size):
+    """The smallest served size at least as large as size (or the largest one)"""
+    for candidate in THUMBNAIL_SIZES:
+        if candidate >= size:
+            return candidate
+    return THUMBNAIL_SIZES[-1]
+
+
+def closest_image(images, size):
+    """The smallest Spotify image at least size wide, else the largest one"""
+    by_width = sorted(images, key=lambda image: image.get('width') or 0)
+    for image in by_width:
+        if (image.get('width') or 0) >= size:
+            return image
+    return by_width[-1]
+
+
+def resize(data, size):
+    """JPEG bytes of the image scaled to fit size x size (never enlarged)"""
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    image.thumbnail((size, size), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+class AlbumArtCache:
+    """Cover thumbnails on disk, evicted least recently used first by total bytes"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._files = None  # file name -> size, least recently used first
+        self._total = 0
+        self._lock = threading.Lock()
+        self._album_locks = {}
+
+    def _index(self):
+        """Load the LRU order from file modification times (called with the lock held)"""
+        if self._files is None:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.jpg'):
+                    stat = os.stat(os.path.join(self.directory, name))
+                    entries.append((stat.st_mtime, name, stat.st_size))
+            self._files = OrderedDict((name, size) for _, name, size in sorted(entries))
+            self._total = sum(self._files.values())
+        return self._files
+
+    def _lookup(self, name):
+        """Path of a cached file, marking it as recently used; None on a miss"""
+        with self._lock:
+            files = self._index()
+            if name not in files:
+                return None
+            files.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            # mtime carries the LRU order across restarts
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._files.pop(name, 0)
+            return None
+        return path
+
+    def _store(self, name, data):
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            files = self._index()
+            atomic_write_bytes(path, data)
+            self._total += len(data) - files.pop(name, 0)
+            files[name] = len(data)
+            while self._total > self.max_bytes and len(files) > 1:
+                old_name, old_size = files.popitem(last=False)
+                self._total -= old_size
+                self.evictions += 1
+                try:
+                    os.unlink(os.path.join(self.directory, old_name))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def _album_lock(self, album_id):
+        with self._lock:
+            return self._album_locks.setdefault(album_id, threading.Lock())
+
+    def cached_path(self, album_id, size):
+        """Path of the cover of album_id at (about) size px if already on disk (never downloads)"""
+        if not ALBUM_ID.match(album_id):
+            return None
+        return self._lookup(f'{album_id}-{snap_size(size)}.jpg')
+
+    def get(self, album_id, size, images):
+        """
+        Path of the cover of album_id at (about) size px, downloading it on a miss.
+
+        images is the album's Spotify image list. Returns None if the album
+        id is invalid or the cover can't be downloaded.
+        """
+        if not ALBUM_ID.match(album_id):
+            return None
+        size = snap_size(size)
+        name = f'{album_id}-{size}.jpg'
+        path = self._lookup(name)
+        if path:
+            self.hits += 1
+            return path
+
+        # One download per album, however many requests arrive at once
+        with self._album_lock(album_id):
+            path = self._lookup(name)
+            if path:
+                self.hits += 1
+                return path
+            self.misses += 1
+            if not images:
+                return None
+            if Image is not None:
+                return self._generate(album_id, size, images)
+            data = self._download(closest_image(images, size)['url'])
+            return self._store(name, data) if data else None
+
+    def _generate(self, album_id, size, images):
+        """Download the largest cover once and store every thumbnail size from it"""
+        data = self._download(closest_image(images, THUMBNAIL_SIZES[-1])['url'])
+        if not data:
+            return None
+        try:
+            paths = {each: self._store(f'{album_id}-{each}.jpg', resize(data, each)) for each in THUMBNAIL_SIZES}
+        except OSError as e:
+            print(f"❌ Could not resize cover for {album_id}: {e}")
+            return self._store(f'{album_id}-{size}.jpg', data)
+        return paths[size]
+
+    def _download(self, url):
+        try:
+            response = spotify_api.get(url)
+        except Exception as e:
+            print(f"❌ Cover download failed: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"❌ Cover download failed: HTTP {response.status_code}")
+            return None
+        return response.content
+
+    def stats(self):
+        with self._lock:
+            files = self._index()
+            return {
+                "files": len(files),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "resizing": Image is not None
+            }
+
+
+# Shared by the web server
+album_art_cache = AlbumArtCache()
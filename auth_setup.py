@@ -4,11 +4,11 @@ Create Spotify authentication cache for real-time updates
 """
 
 import os
-import requests
-import json
+import spotify_api
 import base64
 import time
 from dotenv import load_dotenv
+from file_utils import atomic_write_json
 
 load_dotenv()
 
@@ -66,7 +66,8 @@ def create_auth_cache():
         'redirect_uri': redirect_uri
     }
     
-    response = requests.post(token_url, headers=headers, data=data)
+    # The code is single-use: a retried exchange would only fail with invalid_grant
+    response = spotify_api.post(token_url, headers=headers, data=data, retry=False)
     
     if response.status_code == 200:
         token_data = response.json()
@@ -80,8 +81,7 @@ def create_auth_cache():
             'scope': 'user-read-recently-played'
         }
         
-        with open('.spotify_cache', 'w') as f:
-            json.dump(cache_data, f, indent=2)
+        atomic_write_json('.spotify_cache', cache_data)
         
         print("✅ Authentication successful!")
         print("💾 Token cached for web app")
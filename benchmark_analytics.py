@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized history analytics on synthetic data
+
+Builds a CompactHistory-shaped set of columns with millions of plays
+(without going through SQLite) and times each analysis.
+
+Usage:
+    python benchmark_analytics.py --plays 5000000
+"""
+
+import time
+import argparse
+from array import array
+import numpy as np
+import history_analytics
+from compact_history import CompactHistory
+
+GENRES = ['pop', 'rock', 'indie', 'jazz', 'hip hop', 'techno', 'folk', 'classical', 'metal', 'soul']
+
+
+def synthetic_history(plays, seed=42):
+    """A CompactHistory filled directly through its arrays"""
+    rng = np.random.default_rng(seed)
+    duration = rng.integers(90_000, 360_000, plays, dtype=np.int32)
+    # Most plays run to the end, some are cut short; played_at is the end time
+    listened = np.where(rng.random(plays) < 0.8, duration, rng.integers(5_000, 60_000, plays))
+    pauses = rng.exponential(30_000, plays).astype(np.int64)
+    played_at = 1_400_000_000_000 + np.cumsum(listened + pauses)
+
+    history = CompactHistory()
+    # Genre strings as the history store holds them: comma-joined per play
+    genre_ids = [history.strings.intern(','.join(rng.choice(GENRES, size=rng.integers(1, 4), replace=False)))
+                 for _ in range(200)]
+    history.played_at_ms = array('q', played_at.astype(np.int64).tobytes())
+    history.duration_ms = array('i', duration.tobytes())
+    history.ms_played = array('i', np.full(plays, -1, dtype=np.int32).tobytes())
+    for column in history.columns:
+        history.columns[column] = array('I', np.zeros(plays, dtype=np.uint32).tobytes())
+    history.columns['genres'] = array('I', np.asarray(genre_ids, dtype=np.uint32)[rng.integers(0, 200, plays)].tobytes())
+    return history
+
+
+def timed(label, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    print(f"  {label:<22} {(time.perf_counter() - started) * 1000:8.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the history analytics")
+    parser.add_argument('--plays', type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    print(f"🧪 Generating {args.plays:,} synthetic plays...")
+    history = synthetic_history(args.plays)
+
+    print("⏱️  Timings:")
+    columns = timed("columns", history_analytics.columns_from_history, history)
+    timed("heatmap", history_analytics.hour_of_day_heatmap, columns['played_at_ms'])
+    timed("streaks", history_analytics.listening_streaks, columns['played_at_ms'])
+    timed("genre time share", history_analytics.genre_time_share, columns)
+    timed("skip rate", history_analytics.skip_rate, columns)
+
+    started = time.perf_counter()
+    analytics = history_analytics.analyze(history)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Full analysis of {analytics['plays']:,} plays in {elapsed * 1000:.0f} ms "
+          f"(skip rate {analytics['skips']['skip_rate']:.1%}, longest streak {analytics['streaks']['longest_days']} days)")
+
+
+if __name__ == "__main__":
+    main()
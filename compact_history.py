@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory play history
+
+Stores plays column-wise: timestamps and durations in typed arrays and
+every repeated string (track/artist/album ids and names) interned once in
+a lookup table, with plays holding small integer indexes. Rows are only
+materialized as dicts when somebody looks at them, so keeping years of
+history in the web server costs a few bytes per play instead of a dict
+full of strings.
+"""
+
+import threading
+from array import array
+from collections.abc import Sequence
+
+# Columns that hold interned strings
+STRING_COLUMNS = ('track_id', 'track_name', 'artist_ids', 'artist_name', 'album_id', 'album_name', 'genres')
+
+
+class StringTable:
+    """Interns strings and hands out stable integer ids (0 is reserved for None)"""
+
+    def __init__(self):
+        self.values = [None]
+        self._ids = {None: 0}
+
+    def intern(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return string_id
+
+    def __len__(self):
+        return len(self.values)
+
+
+class PlayView:
+    """Lazy, read-only view of one play; columns are read on access"""
+
+    __slots__ = ('_history', '_index')
+
+    def __init__(self, history, index):
+        self._history = history
+        self._index = index
+
+    def __getitem__(self, column):
+        return self._history.value(column, self._index)
+
+    def get(self, column, default=None):
+        try:
+            value = self[column]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def to_dict(self):
+        return self._history.row(self._index)
+
+    def __repr__(self):
+        return f"PlayView({self.to_dict()!r})"
+
+
+class CompactHistory(Sequence):
+    """
+    Append-only, oldest-first play history held in typed arrays.
+
+    Appends must arrive in played_at order (the history store hands out
+    plays oldest first); indexing returns lazy PlayView rows.
+    """
+
+    def __init__(self):
+        self.strings = StringTable()
+        self.played_at_ms = array('q')
+        self.duration_ms = array('i')  # -1 when unknown
+        self.ms_played = array('i')    # -1 when unknown
+        self.columns = {column: array('I') for column in STRING_COLUMNS}
+        self.last_id = 0  # history store id of the newest stored play held here
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.played_at_ms)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [PlayView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return PlayView(self, index)
+
+    def append(self, row):
+        """Add one play (a history store row)"""
+        with self._lock:
+            if self.played_at_ms and row['played_at_ms'] < self.played_at_ms[-1]:
+                # Out of order - history is append-only
+                return False
+            self.last_id = max(self.last_id, row.get('id') or 0)
+            for column in STRING_COLUMNS:
+                self.columns[column].append(self.strings.intern(row.get(column)))
+            duration_ms, ms_played = row.get('duration_ms'), row.get('ms_played')
+            # 0 is a real value (an instant skip); only None means unknown
+            self.duration_ms.append(-1 if duration_ms is None else duration_ms)
+            self.ms_played.append(-1 if ms_played is None else ms_played)
+            # Written last: readers use len(played_at_ms) as the row count
+            self.played_at_ms.append(row['played_at_ms'])
+            return True
+
+    def extend(self, rows):
+        return sum(1 for row in rows if self.append(row))
+
+    def value(self, column, index):
+        if column == 'played_at_ms':
+            return self.played_at_ms[index]
+        if column in ('duration_ms', 'ms_played'):
+            value = getattr(self, column)[index]
+            return None if value < 0 else value
+        if column in self.columns:
+            return self.strings.values[self.columns[column][index]]
+        raise KeyError(column)
+
+    def row(self, index):
+        """Materialize one play as a dict"""
+        row = {'played_at_ms': self.played_at_ms[index]}
+        for column in STRING_COLUMNS:
+            row[column] = self.strings.values[self.columns[column][index]]
+        row['duration_ms'] = self.value('duration_ms', index)
+        row['ms_played'] = self.value('ms_played', index)
+        return row
+
+    def column_arrays(self, columns=None):
+        """
+        Consistent copies of the raw column arrays (all, or the named ones).
+
+        Copies (plain memcpy) rather than views, so callers can wrap them
+        in NumPy without blocking later appends. 'strings' is the string
+        table, for resolving the interned ids.
+        """
+        numeric = {'played_at_ms': self.played_at_ms, 'duration_ms': self.duration_ms, 'ms_played': self.ms_played}
+        with self._lock:
+            arrays = {}
+            for column in columns or (*numeric, *self.columns):
+                arrays[column] = (numeric[column] if column in numeric else self.columns[column])[:]
+            arrays['strings'] = list(self.strings.values)
+        return arrays
+
+    def recent(self, limit=50):
+        """The newest plays as dicts, newest first"""
+        end = len(self)
+        return [self.row(i) for i in range(end - 1, max(end - limit, 0) - 1, -1)]
+
+    def memory_usage(self):
+        """Approximate bytes used by the arrays and the string table"""
+        arrays = [self.played_at_ms, self.duration_ms, self.ms_played, *self.columns.values()]
+        array_bytes = sum(a.itemsize * len(a) for a in arrays)
+        string_bytes = sum(len(s) for s in self.strings.values if s)
+        return array_bytes + string_bytes
+
+    def stats(self):
+        return {
+            "plays": len(self),
+            "distinct_strings": len(self.strings),
+            "approx_bytes": self.memory_usage()
+        }
+
+    def sync(self, store):
+        """
+        Append plays stored since the newest one held here.
+
+        Plays older than the newest one held (imports of older history)
+        are skipped; callers rebuild when len() falls behind the store.
+        """
+        return self.extend(store.iter_plays(after_id=self.last_id))
+
+    @classmethod
+    def from_store(cls, store):
+        """Load the whole history store"""
+        history = cls()
+        history.extend(store.iter_plays())
+        return history
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Dominant and accent colors of album covers
+
+Covers are downsampled to a few thousand pixels and clustered with a
+vectorized k-means (NumPy). The dominant color is the largest cluster, the
+accent the most colorful cluster that still covers a noticeable part of
+the cover. Palettes are computed once per album in a small worker pool,
+off the request path, and cached with the other metadata. Decoding covers
+needs Pillow; without it (or NumPy) no palettes are produced.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metadata_cache import palette_cache
+from album_art import album_art_cache
+
+try:
+    import numpy as np
+except ImportError:  # palettes are optional
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:  # needed to decode covers
+    Image = None
+
+# Palettes are computed from the 64 px thumbnail (4096 pixels)
+SAMPLE_SIZE = 64
+CLUSTERS = 5
+ITERATIONS = 12
+
+# An accent must cover at least this share of the cover and differ visibly from the dominant color
+MIN_ACCENT_SHARE = 0.05
+MIN_ACCENT_DISTANCE = 60
+
+
+def hex_color(rgb):
+    return '#{:02x}{:02x}{:02x}'.format(*(int(round(c)) for c in rgb))
+
+
+def kmeans(pixels, k=CLUSTERS, iterations=ITERATIONS):
+    """
+    Cluster an (N, 3) float array of RGB pixels.
+
+    Returns (centers, counts) sorted by cluster size, largest first.
+    Initial centers are picked farthest-first starting from the mean color,
+    so results are deterministic and small but distinct colors get a seed.
+    """
+    k = min(k, len(pixels))
+    centers = [pixels.mean(axis=0)]
+    nearest = ((pixels - centers[0]) ** 2).sum(axis=1)
+    for _ in range(k - 1):
+        centers.append(pixels[nearest.argmax()])
+        nearest = np.minimum(nearest, ((pixels - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers, dtype=pixels.dtype)
+
+    for _ in range(iterations):
+        # Squared distances of every pixel to every center: (N, k)
+        distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, pixels)
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        if np.allclose(moved, centers, atol=0.5):
+            centers = moved
+            break
+        centers = moved
+
+    counts = np.bincount(labels, minlength=k)
+    by_size = np.argsort(-counts)
+    return centers[by_size], counts[by_size]
+
+
+def saturation(rgb):
+    """HSV saturation of (k, 3) RGB values in 0..255"""
+    high = rgb.max(axis=1)
+    low = rgb.min(axis=1)
+    return np.where(high > 0, (high - low) / np.maximum(high, 1), 0)
+
+
+def relative_luminance(rgb):
+    """WCAG relative luminance of one RGB color in 0..255"""
+    channels = np.asarray(rgb, dtype=float) / 255
+    linear = np.where(channels <= 0.03928, channels / 12.92, ((channels + 0.055) / 1.055) ** 2.4)
+    return float(linear @ np.array([0.2126, 0.7152, 0.0722]))
+
+
+def palette_from_pixels(pixels):
+    """Palette dict for an (N, 3) array of RGB pixels"""
+    centers, counts = kmeans(pixels.astype(np.float32))
+    shares = counts / counts.sum()
+
+    dominant = centers[0]
+    # Most colorful cluster that is big enough and distinct from the dominant one
+    distances = np.sqrt(((centers - dominant) ** 2).sum(axis=1))
+    candidates = np.flatnonzero((shares >= MIN_ACCENT_SHARE) & (distances >= MIN_ACCENT_DISTANCE))
+    if candidates.size:
+        accent = centers[candidates[saturation(centers[candidates]).argmax()]]
+    else:
+        # Single-color cover: the farthest cluster, however small
+        accent = centers[distances.argmax()]
+
+    return {
+        "dominant": hex_color(dominant),
+        "accent": hex_color(accent),
+        "text": '#111827' if relative_luminance(dominant) > 0.4 else '#ffffff',
+        "colors": [
+            {"color": hex_color(center), "share": round(float(share), 3)}
+            for center, share in zip(centers, shares) if share > 0
+        ]
+    }
+
+
+def palette_from_file(path):
+    """Palette of an image file, downsampled to SAMPLE_SIZE first"""
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+        image.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+        pixels = np.asarray(image, dtype=np.uint8).reshape(-1, 3)
+    return palette_from_pixels(pixels)
+
+
+class PaletteWorker:
+    """Computes album palettes in a background pool, at most once per album at a time"""
+
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='palette')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return np is not None and Image is not None
+
+    def get_cached(self, album_id):
+        return palette_cache.get(album_id) if album_id else None
+
+    def submit(self, album_id, images, callback):
+        """
+        Compute the palette of an album in the background.
+
+        callback(album_id, palette) runs on the worker thread once the
+        palette is known. Returns False if nothing was scheduled.
+        """
+        if not self.available or not album_id or not images:
+            return False
+        with self._lock:
+            if album_id in self._pending:
+                return False
+            self._pending.add(album_id)
+        self._executor.submit(self._run, album_id, images, callback)
+        return True
+
+    def _run(self, album_id, images, callback):
+        try:
+            palette = palette_cache.get(album_id)
+            if palette is None:
+                path = album_art_cache.get(album_id, SAMPLE_SIZE, images)
+                if path is None:
+                    return
+                palette = palette_from_file(path)
+                palette_cache.set(album_id, palette)
+            callback(album_id, palette)
+        except Exception as e:
+            print(f"❌ Palette extraction failed for {album_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(album_id)
+
+
+# Shared by the web server
+palette_worker = PaletteWorker()
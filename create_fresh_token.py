@@ -4,11 +4,11 @@ Create fresh Spotify token from authorization code
 """
 
 import os
-import requests
-import json
+import spotify_api
 import base64
 import time
 from dotenv import load_dotenv
+from file_utils import atomic_write_json
 
 load_dotenv()
 
@@ -43,7 +43,8 @@ def exchange_code_for_token():
         'redirect_uri': redirect_uri
     }
     
-    response = requests.post(token_url, headers=headers, data=data)
+    # The code is single-use: a retried exchange would only fail with invalid_grant
+    response = spotify_api.post(token_url, headers=headers, data=data, retry=False)
     
     if response.status_code == 200:
         token_data = response.json()
@@ -57,8 +58,7 @@ def exchange_code_for_token():
             'scope': 'user-read-recently-played'
         }
         
-        with open('.spotify_cache', 'w') as f:
-            json.dump(cache_data, f, indent=2)
+        atomic_write_json('.spotify_cache', cache_data)
         
         print("✅ Fresh token created!")
         print("💾 Token saved to .spotify_cache")
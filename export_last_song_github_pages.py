@@ -1,85 +1,92 @@
 #!/usr/bin/env python3
 """
 Export last played Spotify song to docs/last_song.json for GitHub Pages
+
+Runs once by default (as the scheduled workflow does). With --watch it
+keeps running: one authenticated client polls recently-played with the
+`after` cursor and bursts of plays are published together, at most once
+per --window seconds, optionally committing and pushing the result.
+
+Usage:
+    python export_last_song_github_pages.py
+    python export_last_song_github_pages.py --watch --window 300 --git
+    python export_last_song_github_pages.py --badge light
 """
 import os
+import sys
 import json
-import requests
-import base64
+import signal
+import argparse
+import threading
+import subprocess
+import spotify_api
 import time
 from dotenv import load_dotenv
+from spotify_auth import UserToken
+from file_utils import atomic_write_json, atomic_write_bytes
+from snapshot import make_etag
+from history_store import history_store, ingest_recently_played
+from compact_history import CompactHistory
+from poll_scheduler import PollScheduler
+from history_feed import HistoryFeed, DEFAULT_FEED_DIR
+from now_playing_badge import render_badge, thumbnail_data_uri, THEME_NAMES
+from spotify_api import get_recently_played_page, get_artists, merge_genres, remember_track, SpotifyUnauthorized
+
+try:
+    import history_analytics
+except ImportError:  # numpy not installed
+    history_analytics = None
+
+SONG_PATH = 'docs/last_song.json'
+ANALYTICS_PATH = 'docs/analytics.json'
+BADGE_PATH = 'docs/now_playing.svg'
+
+# Exit status when the published files are already up to date (nothing to commit)
+EXIT_UNCHANGED = 3
+
+# --watch defaults: publish at most once per window, poll at least every max interval
+DEFAULT_WINDOW = 300
+DEFAULT_MAX_INTERVAL = 300
 
-def load_spotify_token():
-    # Try to load from .spotify_cache (created by manual_auth.py or auth_setup.py)
+# Fields that change on every run without the content changing
+VOLATILE_FIELDS = ('fetched_at', 'generated_at', 'content_hash')
+
+def content_hash(data):
+    """Hash of the meaningful fields, independent of key order and formatting"""
+    meaningful = {key: value for key, value in data.items() if key not in VOLATILE_FIELDS}
+    return make_etag(json.dumps(meaningful, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+
+def write_if_changed(path, data):
+    """
+    Atomically write data as JSON unless the file already holds the same content.
+
+    The hash is stored in the file as content_hash. Returns True if the file was written.
+    """
+    data = dict(data, content_hash=content_hash(data))
     try:
-        with open('.spotify_cache', 'r') as f:
-            cache = json.load(f)
-            access_token = cache.get('access_token')
-            refresh_token = cache.get('refresh_token')
-            expires_in = cache.get('expires_in', 3600)
-            created_at = cache.get('created_at', time.time())
-            
-            # Check if token is expired
-            if time.time() >= created_at + expires_in:
-                print("🔄 Access token expired, refreshing...")
-                new_token = refresh_access_token(refresh_token)
-                if new_token:
-                    return new_token
-                else:
-                    print("❌ Failed to refresh token. Please re-authenticate.")
-                    return None
-            return access_token
-    except Exception as e:
-        print(f"❌ Could not load Spotify token: {e}")
-        return None
+        with open(path, 'r') as f:
+            existing = json.load(f)
+    except (OSError, ValueError):
+        existing = None
+    if isinstance(existing, dict) and content_hash(existing) == data['content_hash']:
+        return False
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    atomic_write_json(path, data)
+    return True
 
-def refresh_access_token(refresh_token):
-    """Refresh the access token using the refresh token"""
-    load_dotenv()
-    CLIENT_ID = os.getenv('SPOTIPY_CLIENT_ID')
-    CLIENT_SECRET = os.getenv('SPOTIPY_CLIENT_SECRET')
-    
-    auth_string = f"{CLIENT_ID}:{CLIENT_SECRET}"
-    auth_bytes = auth_string.encode('ascii')
-    auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-    
-    headers = {
-        'Authorization': f'Basic {auth_b64}',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
-    
-    data = {
-        'grant_type': 'refresh_token',
-        'refresh_token': refresh_token
-    }
-    
-    response = requests.post('https://accounts.spotify.com/api/token', headers=headers, data=data)
-    
-    if response.status_code == 200:
-        token_data = response.json()
-        
-        # Update the cache file with new token
-        cache_data = {
-            'access_token': token_data['access_token'],
-            'refresh_token': refresh_token,  # Keep the same refresh token
-            'expires_in': token_data['expires_in'],
-            'created_at': time.time(),
-            'scope': 'user-read-recently-played'
-        }
-        
-        with open('.spotify_cache', 'w') as f:
-            json.dump(cache_data, f, indent=2)
-        
-        print("✅ Token refreshed successfully!")
-        return token_data['access_token']
-    else:
-        print(f"❌ Token refresh failed: {response.status_code}")
+def load_user_token():
+    # Load from .spotify_cache (created by manual_auth.py or auth_setup.py);
+    # the token refreshes itself and saves new tokens when it expires
+    user_token = UserToken()
+    if not user_token.load():
+        print("❌ Failed to load or refresh token. Please re-authenticate.")
         return None
+    return user_token
 
 def get_last_played_song(access_token):
     headers = {'Authorization': f'Bearer {access_token}'}
     url = 'https://api.spotify.com/v1/me/player/recently-played?limit=1'
-    resp = requests.get(url, headers=headers)
+    resp = spotify_api.get(url, headers=headers)
     if resp.status_code != 200:
         print(f"❌ Spotify API error: {resp.status_code}")
         return None
@@ -89,18 +96,21 @@ def get_last_played_song(access_token):
         return None
     item = data['items'][0]
     track = item['track']
-    # Get genres from artist
-    artist_id = track['artists'][0]['id']
-    artist_resp = requests.get(f'https://api.spotify.com/v1/artists/{artist_id}', headers=headers)
-    genres = []
-    if artist_resp.status_code == 200:
-        genres = artist_resp.json().get('genres', [])
+    remember_track(track)
+    # Get genres from all artists in one batch request
+    try:
+        artists = [a for a in get_artists([a['id'] for a in track['artists']], access_token) if a]
+    except SpotifyUnauthorized:
+        artists = []
+    genres = merge_genres(artists)
     # Format output
     return {
         'song_name': track['name'],
         'artist': ', '.join([a['name'] for a in track['artists']]),
         'album': track['album']['name'],
+        'album_id': track['album'].get('id'),
         'cover_image': track['album']['images'][0]['url'] if track['album']['images'] else None,
+        'cover_images': track['album']['images'],
         'genres': genres[:3] if genres else ['Unknown'],
         'duration_ms': track['duration_ms'],
         'popularity': track['popularity'],
@@ -111,20 +121,175 @@ def get_last_played_song(access_token):
         'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
     }
 
+def export_analytics(path=ANALYTICS_PATH):
+    """Write listening analytics over the whole play history (needs numpy)"""
+    if history_analytics is None:
+        print("⚠️ numpy not installed - skipping analytics export")
+        return False
+    history = CompactHistory.from_store(history_store)
+    analytics = history_analytics.analyze(history, today_ms=int(time.time() * 1000))
+    analytics['generated_at'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    if not write_if_changed(path, analytics):
+        print(f"⏸️ Analytics unchanged - {path} left as is")
+        return False
+    print(f"📈 Analytics over {analytics['plays']} plays exported to {path}")
+    return True
+
+def ingest_history(access_token):
+    """Save plays newer than the stored cursor; returns the new rows"""
+    new_plays = ingest_recently_played(
+        lambda after: get_recently_played_page(access_token, after=after), history_store,
+        fetch_artists=lambda artist_ids: get_artists(artist_ids, access_token)
+    )
+    print(f"📚 {len(new_plays)} new play(s) saved to history")
+    return new_plays
+
+def export_badge(song, theme, path=BADGE_PATH):
+    """Write the now-playing SVG badge; returns True if it changed"""
+    body = render_badge(song, theme, thumbnail_data_uri(song))
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == body:
+                return False
+    except OSError:
+        pass
+    atomic_write_bytes(path, body)
+    print(f"🏷️ Badge exported to {path}")
+    return True
+
+def export(access_token, badge_theme=None):
+    """Write the song, analytics, history feed (and badge) files; returns the paths that changed (None on error)"""
+    song = get_last_played_song(access_token)
+    if not song:
+        print("❌ Could not fetch last played song.")
+        return None
+    written = []
+    if write_if_changed(SONG_PATH, song):
+        print(f"✅ Last played song exported to {SONG_PATH}")
+        written.append(SONG_PATH)
+    if badge_theme and export_badge(song, badge_theme):
+        written.append(BADGE_PATH)
+    if export_analytics():
+        written.append(ANALYTICS_PATH)
+    if HistoryFeed(DEFAULT_FEED_DIR).update():
+        print(f"🗂️ History feed updated in {DEFAULT_FEED_DIR}")
+        written.append(DEFAULT_FEED_DIR)
+    return written
+
+def git_publish(paths, message="Update last played song"):
+    """Commit the given files and push; failures are reported, not raised"""
+    try:
+        subprocess.run(['git', 'add', *paths], check=True)
+        if subprocess.run(['git', 'diff', '--cached', '--quiet']).returncode == 0:
+            return
+        subprocess.run(['git', 'commit', '-q', '-m', message], check=True)
+        subprocess.run(['git', 'push', '-q'], check=True)
+        print(f"🚀 Committed and pushed {', '.join(paths)}")
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"❌ Git publish failed: {e}")
+
+def watch(user_token, window=DEFAULT_WINDOW, max_interval=DEFAULT_MAX_INTERVAL, commit=False, badge_theme=None):
+    """
+    Poll for new plays until stopped, publishing at most once per window.
+
+    The first new play opens a window; every play arriving before it
+    closes goes out with the same write (and commit).
+    """
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    scheduler = PollScheduler(max_interval=max_interval)
+    latest = None         # newest play seen, drives the poll schedule
+    pending_since = None  # when the first unpublished play arrived
+
+    def publish():
+        """Export (and commit); returns False if it has to be retried"""
+        access_token = user_token.get()
+        if not access_token:
+            return False
+        try:
+            written = export(access_token, badge_theme)
+        except Exception as e:
+            print(f"❌ Publishing failed: {e}")
+            return False
+        if written and commit:
+            git_publish(written)
+        return written is not None
+
+    print(f"👀 Watching for new plays (publishing at most every {window}s)")
+    try:
+        while not stop.is_set():
+            new_plays = []
+            access_token = user_token.get()
+            if not access_token and not user_token.refresh_token:
+                print("❌ No refresh token. Please re-authenticate.")
+                break
+            if not access_token:
+                print("⚠️ Token refresh failed - retrying on the next poll")
+            else:
+                try:
+                    new_plays = ingest_history(access_token)
+                except SpotifyUnauthorized:
+                    user_token.invalidate()
+                except Exception as e:
+                    # Network, rate limit or database trouble: keep the daemon alive
+                    print(f"❌ Polling error: {e}")
+
+            now = time.time()
+            if new_plays:
+                latest = new_plays[-1]
+                pending_since = pending_since or now
+            if pending_since and now - pending_since >= window:
+                # On failure, keep the plays pending and try again one window later
+                pending_since = None if publish() else now
+
+            interval = scheduler.next_interval(
+                latest and latest['played_at'], latest and latest['duration_ms'], changed=bool(new_plays), now=now
+            )
+            if pending_since:
+                # Wake up in time to close the window
+                interval = max(1, min(interval, pending_since + window - now))
+            stop.wait(interval)
+    except KeyboardInterrupt:
+        pass
+
+    if pending_since:
+        print("📤 Publishing pending plays before exiting")
+        publish()
+
 def main():
+    parser = argparse.ArgumentParser(description="Export the last played song for GitHub Pages")
+    parser.add_argument('--watch', action='store_true', help="keep running and publish new plays as they arrive")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help="with --watch: seconds to collect plays before publishing them together")
+    parser.add_argument('--max-interval', type=int, default=DEFAULT_MAX_INTERVAL,
+                        help="with --watch: longest wait between polls while nothing is playing")
+    parser.add_argument('--git', action='store_true', help="with --watch: commit and push every publish")
+    parser.add_argument('--badge', nargs='?', const='dark', choices=THEME_NAMES, metavar='THEME',
+                        help=f"also write {BADGE_PATH} (theme: {', '.join(THEME_NAMES)}; default dark)")
+    args = parser.parse_args()
+
     load_dotenv()
-    access_token = load_spotify_token()
+    user_token = load_user_token()
+    access_token = user_token.get() if user_token else None
     if not access_token:
         print("❌ No valid Spotify access token. Exiting.")
-        exit(1)
-    song = get_last_played_song(access_token)
-    if not song:
-        print("❌ Could not fetch last played song.")
-        exit(1)
-    os.makedirs('docs', exist_ok=True)
-    with open('docs/last_song.json', 'w') as f:
-        json.dump(song, f, indent=2)
-    print("✅ Last played song exported to docs/last_song.json")
+        sys.exit(1)
+
+    if args.watch:
+        watch(user_token, args.window, args.max_interval, args.git, args.badge)
+        return
+
+    try:
+        ingest_history(access_token)
+    except Exception as e:
+        # The history is a bonus; never let it block publishing the song
+        print(f"❌ History ingestion failed: {e}")
+    written = export(access_token, args.badge)
+    if written is None:
+        sys.exit(1)
+    if not written:
+        print(f"⏸️ {SONG_PATH} is up to date - nothing to publish")
+        sys.exit(EXIT_UNCHANGED)
 
 if __name__ == "__main__":
     main()
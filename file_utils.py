@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Small file helpers shared by the scripts
+"""
+
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_writer(path):
+    """
+    Open a binary file that atomically replaces path when the block ends.
+
+    The data goes to a temporary file in the same directory which then
+    replaces the target, so readers never see a half-written file. If the
+    block raises, the target is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write_bytes(path, data):
+    """Write bytes to path atomically"""
+    with atomic_writer(path) as f:
+        f.write(data)
+
+
+def atomic_write_json(path, obj, indent=2):
+    """Serialize obj as JSON and write it to path atomically"""
+    atomic_write_bytes(path, json.dumps(obj, indent=indent).encode('utf-8'))
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Paginated static history feed for GitHub Pages
+
+Publishes the play history as fixed-size JSON pages ("shards") plus an
+index.json manifest, so a static client can lazy-load it page by page:
+
+    docs/history/index.json                     manifest, rewritten on change
+    docs/history/plays-00000.<hash>.json        full shard, never changes
+    docs/history/plays-latest.json              newest, still filling shard
+
+Full shards are named after their content hash and never rewritten, so
+they can be cached forever. The feed is also a backup: if the history
+store holds fewer plays than the feed (e.g. a lost CI cache), the store
+is restored from the feed instead of the feed shrinking. Every file also
+gets a precompressed .gz variant, and a .br variant when the brotli
+package is installed. Shards are streamed from the history store to disk
+one play at a time.
+
+Usage:
+    python history_feed.py --out docs/history
+"""
+
+import os
+import json
+import gzip
+import shutil
+import filecmp
+import hashlib
+import argparse
+import itertools
+from file_utils import atomic_writer
+from history_store import history_store, HistoryStore, iso_to_ms
+
+try:
+    import brotli
+except ImportError:  # .br variants are optional
+    brotli = None
+
+DEFAULT_FEED_DIR = 'docs/history'
+SHARD_SIZE = 1000
+FEED_VERSION = 3
+
+MANIFEST_NAME = 'index.json'
+LATEST_NAME = 'plays-latest.json'
+
+# Fields of a history row published in the feed
+FEED_FIELDS = ('played_at', 'track_id', 'track_name', 'artist_name', 'album_id', 'album_name', 'duration_ms', 'ms_played', 'source')
+
+# Comma-separated columns, published as lists
+LIST_FIELDS = ('artist_ids', 'genres')
+
+
+def feed_play(row):
+    """The public form of a history row (unknown fields left out)"""
+    play = {field: row[field] for field in FEED_FIELDS if row.get(field) is not None}
+    for field in LIST_FIELDS:
+        if row.get(field):
+            play[field] = row[field].split(',')
+    return play
+
+
+def play_from_feed(play):
+    """Turn a published play back into a history row"""
+    row = {field: play.get(field) for field in FEED_FIELDS}
+    row['played_at_ms'] = iso_to_ms(play['played_at'])
+    for field in LIST_FIELDS:
+        row[field] = ','.join(play.get(field) or []) or None
+    row['source'] = play.get('source') or 'api'
+    return row
+
+
+class JsonArrayWriter:
+    """
+    Writes a JSON array to a binary file one element at a time.
+
+    Keeps a running SHA-256 of everything written, so a file can be named
+    after its content without reading it back.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+        self.sha256 = hashlib.sha256()
+        self._write(b'[')
+
+    def _write(self, data):
+        self.f.write(data)
+        self.sha256.update(data)
+
+    def write(self, item):
+        separator = b',\n' if self.count else b'\n'
+        self._write(separator + json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        self.count += 1
+
+    def close(self):
+        self._write(b'\n]\n')
+
+    def hexdigest(self, length=16):
+        return self.sha256.hexdigest()[:length]
+
+
+def write_compressed(path):
+    """Write path.gz (and path.br with brotli) next to path, streaming from it"""
+    with open(path, 'rb') as source, atomic_writer(path + '.gz') as target:
+        # mtime=0 keeps the output identical for identical input
+        with gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=target, mtime=0) as gz:
+            shutil.copyfileobj(source, gz)
+
+    if brotli is not None:
+        compressor = brotli.Compressor(quality=11)
+        with open(path, 'rb') as source, atomic_writer(path + '.br') as target:
+            for chunk in iter(lambda: source.read(1 << 16), b''):
+                target.write(compressor.process(chunk))
+            target.write(compressor.finish())
+
+
+def write_if_different(path, data):
+    """Atomically write bytes (plus compressed variants) unless path already holds them"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    with atomic_writer(path) as f:
+        f.write(data)
+    write_compressed(path)
+    return True
+
+
+class HistoryFeed:
+    """Writes and incrementally updates the sharded feed in one directory"""
+
+    def __init__(self, directory=DEFAULT_FEED_DIR, store=history_store, shard_size=SHARD_SIZE):
+        self.directory = directory
+        self.store = store
+        self.shard_size = shard_size
+
+    def _read_manifest(self):
+        """The manifest as published, whatever its version (None if missing)"""
+        try:
+            with open(os.path.join(self.directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_manifest(self):
+        """The manifest, if it matches this feed's version and shard size"""
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get('version') != FEED_VERSION or manifest.get('shard_size') != self.shard_size:
+            return None
+        return manifest
+
+    def _still_valid(self, shard, index):
+        """A finished shard stays valid while its last play is still at the same position"""
+        end = (index + 1) * self.shard_size
+        return (os.path.exists(os.path.join(self.directory, shard['file']))
+                and self.store.play_id_at(end - 1) == shard['last_id'])
+
+    def _stream_rows(self, index, plays):
+        """Stream rows into a temporary shard file; returns (tmp_path, writer, first, last)"""
+        tmp_path = os.path.join(self.directory, f'.plays-{index:05d}.tmp')
+        with atomic_writer(tmp_path) as f:
+            writer = JsonArrayWriter(f)
+            first = last = None
+            for row in plays:
+                writer.write(feed_play(row))
+                first = first or row
+                last = row
+            writer.close()
+        return tmp_path, writer, first, last
+
+    def _finish_shard(self, index, tmp_path, writer, first, last):
+        """Move a full temporary shard to its content-hashed name"""
+        name = f'plays-{index:05d}.{writer.hexdigest()}.json'
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+            write_compressed(path)
+        return {
+            "file": name,
+            "plays": writer.count,
+            "first_played_at_ms": first['played_at_ms'],
+            "last_played_at_ms": last['played_at_ms'],
+            "last_id": last['id']
+        }
+
+    def update(self):
+        """
+        Bring the feed up to date with the history store.
+
+        Only shards after the last still-valid finished shard are written.
+        Returns True if anything in the feed changed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # Checked against any published version, so a format change can't shrink the feed either
+        published = self._read_manifest()
+        if published and self.store.count() < published.get('total_plays', 0):
+            self.restore_store(published)
+            if self.store.count() < published['total_plays']:
+                # Never let a smaller store shrink the published history
+                print(f"⚠️ History store has fewer plays than the feed - leaving {self.directory} as is")
+                return False
+        previous = self.load_manifest()
+
+        shards = []
+        for index, shard in enumerate(previous['shards'] if previous else []):
+            if not self._still_valid(shard, index):
+                break
+            shards.append(shard)
+
+        # Stream the remaining plays shard by shard; the first one that isn't full becomes the latest shard
+        plays = self.store.iter_plays(offset=len(shards) * self.shard_size)
+        while True:
+            tmp_path, writer, first, last = self._stream_rows(len(shards), itertools.islice(plays, self.shard_size))
+            if writer.count < self.shard_size:
+                break
+            shards.append(self._finish_shard(len(shards), tmp_path, writer, first, last))
+        latest_changed = self._finish_latest(tmp_path)
+
+        manifest = {
+            "version": FEED_VERSION,
+            "shard_size": self.shard_size,
+            "total_plays": len(shards) * self.shard_size + writer.count,
+            "shards": shards,
+            "latest": {"file": LATEST_NAME, "plays": writer.count},
+            "compression": ['gz', 'br'] if brotli is not None else ['gz']
+        }
+        body = json.dumps(manifest, indent=2).encode('utf-8')
+        manifest_changed = write_if_different(os.path.join(self.directory, MANIFEST_NAME), body)
+
+        self._remove_stale_shards({shard['file'] for shard in shards})
+        return latest_changed or manifest_changed
+
+    def _finish_latest(self, tmp_path):
+        """Replace the latest shard with a temporary one unless they are identical"""
+        path = os.path.join(self.directory, LATEST_NAME)
+        if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+            os.unlink(tmp_path)
+            return False
+        os.replace(tmp_path, path)
+        write_compressed(path)
+        return True
+
+    def restore_store(self, manifest):
+        """Re-import every published play into the store; returns the number restored"""
+        restored = 0
+        for name in [shard['file'] for shard in manifest['shards']] + [LATEST_NAME]:
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    plays = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not restore from {name}: {e}")
+                continue
+            restored += len(self.store.add_plays(play_from_feed(play) for play in plays))
+        print(f"♻️ Restored {restored} plays into the history store from {self.directory}")
+        return restored
+
+    def _remove_stale_shards(self, keep):
+        """Delete shard files no longer listed in the manifest (after older plays were imported)"""
+        for name in os.listdir(self.directory):
+            base = name[:-3] if name.endswith(('.gz', '.br')) else name
+            if base.startswith('plays-') and base != LATEST_NAME and base not in keep:
+                os.unlink(os.path.join(self.directory, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the sharded static history feed")
+    parser.add_argument('--out', default=DEFAULT_FEED_DIR, help="feed directory")
+    parser.add_argument('--db', help="history database (defaults to the shared history store)")
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db) if args.db else history_store
+    feed = HistoryFeed(args.out, store, args.shard_size)
+    changed = feed.update()
+    manifest = feed.load_manifest()
+    print(f"{'✅' if changed else '⏸️'} History feed in {args.out}: "
+          f"{manifest['total_plays']} plays in {len(manifest['shards'])} full shard(s) + latest"
+          f"{'' if changed else ' (unchanged)'}")
+
+
+if __name__ == "__main__":
+    main()
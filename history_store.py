@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Local play history store
+
+Plays are appended to an indexed SQLite table, de-duplicated by a play
+key (timestamp plus track) and, across the API and data exports, by the
+same track ending within the same second.
+Hourly and all-time listening aggregates are updated in the same
+transaction as each insert, so statistics never need a history scan.
+New plays are ingested incrementally from the recently-played endpoint
+using the `after` cursor saved by the previous run, so nothing played
+between two polls gets lost.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from metadata_cache import artist_cache
+
+DEFAULT_HISTORY_PATH = os.getenv('HISTORY_DB_PATH', '.history.sqlite')
+
+# recently-played returns at most 50 items per page
+PAGE_SIZE = 50
+MAX_PAGES = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    play_key TEXT NOT NULL UNIQUE,
+    played_at_ms INTEGER NOT NULL,
+    played_at TEXT NOT NULL,
+    track_id TEXT,
+    track_name TEXT NOT NULL,
+    artist_ids TEXT,
+    artist_name TEXT,
+    album_id TEXT,
+    album_name TEXT,
+    duration_ms INTEGER,
+    ms_played INTEGER,
+    genres TEXT,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plays_played_at ON plays (played_at_ms);
+CREATE INDEX IF NOT EXISTS plays_track_time ON plays (track_id, played_at_ms);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS stats_hourly (
+    dimension TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    plays INTEGER NOT NULL,
+    ms INTEGER NOT NULL,
+    PRIMARY KEY (dimension, hour, key)
+);
+CREATE TABLE IF NOT EXISTS stats_total (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    plays INTEGER NOT NULL,
+    ms INTEGER NOT NULL,
+    PRIMARY KEY (dimension, key)
+);
+"""
+
+# Bump when the aggregate layout changes; older databases are rebuilt once
+AGGREGATES_VERSION = '2'
+
+HOUR_MS = 60 * 60 * 1000
+
+# Data exports only have second precision; an API play of the same track
+# this close to an exported one is the same play
+CROSS_SOURCE_WINDOW_MS = 1000
+
+COLUMNS = (
+    'played_at_ms', 'played_at', 'track_id', 'track_name', 'artist_ids', 'artist_name',
+    'album_id', 'album_name', 'duration_ms', 'ms_played', 'genres', 'source'
+)
+
+
+def iso_to_ms(timestamp):
+    """Convert an ISO timestamp such as 2025-08-08T15:45:17.431Z to epoch milliseconds"""
+    return int(datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp() * 1000)
+
+
+def ms_to_iso(ms):
+    """Convert epoch milliseconds to an ISO timestamp in UTC"""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def cached_genres(artist_ids, artists=None):
+    """Genres for the given artists from `artists` (id -> artist) or the metadata cache (no network)"""
+    genres = []
+    for artist_id in artist_ids:
+        artist = (artists or {}).get(artist_id) or artist_cache.get(artist_id)
+        if artist:
+            genres.extend(g for g in artist.get('genres', []) if g not in genres)
+    return genres
+
+
+def play_from_item(item, artists=None):
+    """
+    Turn a recently-played item into a history row (artists: id -> full artist, for genres).
+
+    Local files come without track and artist ids; they are keyed by name
+    like exported plays.
+    """
+    track = item['track']
+    artist_ids = [a['id'] for a in track.get('artists') or [] if a.get('id')]
+    genres = cached_genres(artist_ids, artists)
+    album = track.get('album') or {}
+    return {
+        'played_at_ms': iso_to_ms(item['played_at']),
+        'played_at': item['played_at'],
+        'track_id': track.get('id'),
+        'track_name': track['name'],
+        'artist_ids': ','.join(artist_ids) or None,
+        'artist_name': ', '.join(a['name'] for a in track.get('artists') or [] if a.get('name')) or None,
+        'album_id': album.get('id'),
+        'album_name': album.get('name'),
+        'duration_ms': track.get('duration_ms'),
+        'ms_played': None,
+        'genres': ','.join(genres) or None,
+        'source': 'api'
+    }
+
+
+def play_key(row):
+    """
+    Identity of a play: when it ended plus which track it was.
+
+    API timestamps have milliseconds, export timestamps only seconds, so
+    two different tracks ending in the same exported second stay apart.
+    """
+    return f"{row['played_at_ms']}:{row.get('track_id') or row['track_name']}"
+
+
+def listened_ms(row):
+    """How long a play lasted: ms_played when known, else the track duration"""
+    if row.get('ms_played') is not None:
+        return row['ms_played']
+    return row.get('duration_ms') or 0
+
+
+def artist_names(row):
+    """
+    Individual artist names of a play.
+
+    API rows join all artist names with ", "; only split them when that
+    yields exactly one name per artist id, so names containing a comma
+    stay intact.
+    """
+    name = row.get('artist_name')
+    if not name:
+        return []
+    ids = (row.get('artist_ids') or '').split(',')
+    parts = name.split(', ')
+    if len(ids) > 1 and len(parts) == len(ids):
+        return parts
+    return [name]
+
+
+def aggregate_keys(row):
+    """(dimension, key) pairs a play counts towards"""
+    keys = [('total', '')]
+    track = row['track_name']
+    if row.get('artist_name'):
+        track = f"{track} — {row['artist_name']}"
+    keys.append(('track', track))
+    keys.extend(('artist', name) for name in artist_names(row))
+    keys.extend(('genre', genre) for genre in (row.get('genres') or '').split(',') if genre)
+    return keys
+
+
+class HistoryStore:
+    """SQLite-backed play history, safe to share between threads and processes"""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._migrate(conn)
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            if self.get_state('aggregates_version') != AGGREGATES_VERSION:
+                self.rebuild_aggregates()
+        return conn
+
+    def _migrate(self, conn):
+        """Move databases keyed by played_at alone to the play_key schema (one-off)"""
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(plays)')]
+        if not columns or 'play_key' in columns:
+            return
+        with conn:
+            conn.execute('ALTER TABLE plays RENAME TO plays_old')
+            conn.execute('DROP INDEX IF EXISTS plays_track_id')
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            conn.execute(
+                f"INSERT INTO plays (play_key, {', '.join(COLUMNS)}) "
+                f"SELECT played_at_ms || ':' || COALESCE(track_id, track_name), {', '.join(COLUMNS)} "
+                f"FROM plays_old ORDER BY played_at_ms"
+            )
+            conn.execute('DROP TABLE plays_old')
+
+    def _seen_in_other_source(self, conn, row):
+        """Whether the other source (API vs. export) already has this play"""
+        if not row.get('track_id'):
+            return False
+        ms = row['played_at_ms']
+        return conn.execute(
+            'SELECT 1 FROM plays WHERE track_id = ? AND source != ? AND played_at_ms BETWEEN ? AND ? LIMIT 1',
+            (row['track_id'], row['source'], ms - CROSS_SOURCE_WINDOW_MS, ms + CROSS_SOURCE_WINDOW_MS)
+        ).fetchone() is not None
+
+    def add_plays(self, rows):
+        """
+        Insert plays, skipping any that are already stored.
+
+        Returns the rows that were actually new, oldest first.
+        """
+        rows = sorted(rows, key=lambda row: row['played_at_ms'])
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        sql = f"INSERT OR IGNORE INTO plays (play_key, {', '.join(COLUMNS)}) VALUES (?, {placeholders})"
+
+        new_rows = []
+        conn = self._connect()
+        with conn:
+            for row in rows:
+                if self._seen_in_other_source(conn, row):
+                    continue
+                cursor = conn.execute(sql, [play_key(row)] + [row.get(column) for column in COLUMNS])
+                if cursor.rowcount:
+                    new_rows.append(row)
+            if new_rows:
+                self._update_aggregates(conn, new_rows)
+                conn.execute(
+                    "INSERT INTO state (key, value) VALUES ('plays_version', '1') "
+                    "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+                )
+        return new_rows
+
+    def _update_aggregates(self, conn, rows):
+        """Fold plays into the hourly and all-time aggregates"""
+        hourly = {}
+        totals = {}
+        for row in rows:
+            hour = row['played_at_ms'] // HOUR_MS
+            ms = listened_ms(row)
+            for dimension, key in aggregate_keys(row):
+                for bucket, bucket_key in ((hourly, (dimension, hour, key)), (totals, (dimension, key))):
+                    plays, total_ms = bucket.get(bucket_key, (0, 0))
+                    bucket[bucket_key] = (plays + 1, total_ms + ms)
+
+        conn.executemany(
+            'INSERT INTO stats_hourly (dimension, hour, key, plays, ms) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(dimension, hour, key) DO UPDATE SET '
+            'plays = plays + excluded.plays, ms = ms + excluded.ms',
+            [(*key, plays, ms) for key, (plays, ms) in hourly.items()]
+        )
+        conn.executemany(
+            'INSERT INTO stats_total (dimension, key, plays, ms) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(dimension, key) DO UPDATE SET '
+            'plays = plays + excluded.plays, ms = ms + excluded.ms',
+            [(*key, plays, ms) for key, (plays, ms) in totals.items()]
+        )
+
+    def rebuild_aggregates(self, batch_size=10000):
+        """Recompute all aggregates from the plays table (one-off migration)"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM stats_hourly')
+            conn.execute('DELETE FROM stats_total')
+            cursor = conn.execute('SELECT * FROM plays ORDER BY played_at_ms, id')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                self._update_aggregates(conn, [dict(row) for row in rows])
+            conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES ('aggregates_version', ?)",
+                (AGGREGATES_VERSION,)
+            )
+
+    def get_state(self, key, default=None):
+        row = self._connect().execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM plays').fetchone()[0]
+
+    def play_id_at(self, position):
+        """Id of the play at a position in time order (None past the end)"""
+        row = self._connect().execute(
+            'SELECT id FROM plays ORDER BY played_at_ms, id LIMIT 1 OFFSET ?', (position,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def iter_plays(self, since_ms=None, batch_size=10000, after_id=None, offset=0):
+        """
+        Yield plays oldest first (ties in insertion order).
+
+        since_ms starts at a timestamp; after_id yields only plays stored
+        after the one with that id, in insertion order instead; offset
+        skips that many plays.
+        """
+        if after_id is not None:
+            sql, params = 'SELECT * FROM plays WHERE id > ? ORDER BY id', (after_id,)
+        else:
+            sql, params = 'SELECT * FROM plays WHERE played_at_ms >= ? ORDER BY played_at_ms, id', (since_ms or 0,)
+        cursor = self._connect().execute(f'{sql} LIMIT -1 OFFSET ?', (*params, offset))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+
+    def version(self):
+        """Changes whenever new plays are added, by any process"""
+        return self.get_state('plays_version', '0')
+
+    def top(self, dimension, since_ms=None, limit=10):
+        """
+        Top keys of a dimension by play count, read from the aggregates.
+
+        With since_ms only the hourly buckets inside the window are summed,
+        so the cost depends on the window length, not on the history size.
+        """
+        conn = self._connect()
+        if since_ms is None:
+            rows = conn.execute(
+                'SELECT key, plays, ms FROM stats_total WHERE dimension = ? '
+                'ORDER BY plays DESC, ms DESC LIMIT ?',
+                (dimension, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                'SELECT key, SUM(plays) AS plays, SUM(ms) AS ms FROM stats_hourly '
+                'WHERE dimension = ? AND hour >= ? GROUP BY key '
+                'ORDER BY plays DESC, ms DESC LIMIT ?',
+                (dimension, since_ms // HOUR_MS, limit)
+            ).fetchall()
+        return [{"name": key, "plays": plays, "ms": ms} for key, plays, ms in rows]
+
+
+def page_artists(items, fetch_artists):
+    """Full artists (id -> artist) of a page's tracks that the metadata cache doesn't have"""
+    missing = list(dict.fromkeys(
+        artist['id'] for item in items for artist in item['track']['artists']
+        if artist.get('id') and artist_cache.get(artist['id']) is None
+    ))
+    if not missing:
+        return {}
+    try:
+        return {artist['id']: artist for artist in fetch_artists(missing) if artist}
+    except Exception as e:
+        print(f"⚠️ Could not fetch artist genres: {e}")
+        return {}
+
+
+def ingest_recently_played(fetch_page, store, fetch_artists=None):
+    """
+    Pull every play newer than the saved cursor into the store.
+
+    fetch_page(after) must return a recently-played page (the decoded JSON)
+    for `limit=50&after=<after>`, or None on error. fetch_artists(ids), if
+    given, returns full artist objects for ids missing from the metadata
+    cache, so new plays get their genres. Returns the new rows.
+    """
+    after = store.get_state('recently_played_after')
+    new_rows = []
+
+    for _ in range(MAX_PAGES):
+        page = fetch_page(int(after) if after else None)
+        if not page or not page.get('items'):
+            break
+
+        artists = page_artists(page['items'], fetch_artists) if fetch_artists else None
+        new_rows.extend(store.add_plays(play_from_item(item, artists) for item in page['items']))
+
+        newest = max(iso_to_ms(item['played_at']) for item in page['items'])
+        cursor_after = (page.get('cursors') or {}).get('after')
+        next_after = max(int(cursor_after or 0), newest)
+        if after and next_after <= int(after):
+            break
+        after = next_after
+        store.set_state('recently_played_after', after)
+
+        if len(page['items']) < PAGE_SIZE:
+            break
+
+    return new_rows
+
+
+# Shared by every entry point in this process
+history_store = HistoryStore()
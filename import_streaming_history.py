@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Import Spotify extended streaming history into the local history store
+
+Reads the Streaming_History_Audio_*.json files from a Spotify data export
+one object at a time, so multi-hundred-MB files never have to fit in
+memory. Runs fully offline; re-running it on the same files is safe
+because plays are de-duplicated by timestamp and track, and plays the
+API already recorded are recognized as well.
+
+Usage:
+    python import_streaming_history.py ~/Downloads/my_spotify_data
+    python import_streaming_history.py Streaming_History_Audio_2023.json
+"""
+
+import os
+import sys
+import glob
+import json
+import re
+import time
+import argparse
+from history_store import history_store, HistoryStore, iso_to_ms
+
+FILE_PATTERN = 'Streaming_History_Audio_*.json'
+CHUNK_SIZE = 1 << 16
+BATCH_SIZE = 5000
+
+WHITESPACE = re.compile(r'\s*')
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(f, chunk_size=CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array without reading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # Skip whitespace (and, inside the array, separating commas)
+        pos = (SEPARATORS if started else WHITESPACE).match(buffer, pos).end()
+
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Most likely an element cut off at the end of the chunk
+                if eof:
+                    raise
+            else:
+                yield obj
+                continue
+        elif eof:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def play_from_record(record):
+    """Turn an extended streaming history record into a history row (None for podcasts)"""
+    track_name = record.get('master_metadata_track_name')
+    if not track_name or not record.get('ts'):
+        return None
+
+    uri = record.get('spotify_track_uri') or ''
+    return {
+        'played_at_ms': iso_to_ms(record['ts']),
+        'played_at': record['ts'],
+        'track_id': uri.rsplit(':', 1)[-1] if uri.startswith('spotify:track:') else None,
+        'track_name': track_name,
+        'artist_ids': None,
+        'artist_name': record.get('master_metadata_album_artist_name'),
+        'album_id': None,
+        'album_name': record.get('master_metadata_album_album_name'),
+        'duration_ms': None,
+        'ms_played': record.get('ms_played'),
+        'genres': None,
+        'source': 'export'
+    }
+
+
+def find_history_files(paths):
+    """Expand directories to the streaming history files they contain"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '**', FILE_PATTERN), recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+
+def import_file(path, store, batch_size=BATCH_SIZE):
+    """Import one file; returns (records read, plays inserted)"""
+    read = inserted = 0
+    batch = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for record in iter_json_array(f):
+            read += 1
+            row = play_from_record(record)
+            if row:
+                batch.append(row)
+            if len(batch) >= batch_size:
+                inserted += len(store.add_plays(batch))
+                batch = []
+    if batch:
+        inserted += len(store.add_plays(batch))
+    return read, inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Spotify extended streaming history dumps")
+    parser.add_argument('paths', nargs='+', help=f"{FILE_PATTERN} files or directories containing them")
+    parser.add_argument('--db', help="history database (defaults to the shared history store)")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db) if args.db else history_store
+    files = find_history_files(args.paths)
+    if not files:
+        print(f"❌ No {FILE_PATTERN} files found.")
+        sys.exit(1)
+
+    total_read = total_inserted = 0
+    started = time.perf_counter()
+    for path in files:
+        file_started = time.perf_counter()
+        read, inserted = import_file(path, store)
+        elapsed = time.perf_counter() - file_started
+        rate = read / elapsed if elapsed else 0
+        print(f"📥 {os.path.basename(path)}: {read} records, {inserted} new plays ({rate:,.0f} rows/sec)")
+        total_read += read
+        total_inserted += inserted
+
+    elapsed = time.perf_counter() - started
+    rate = total_read / elapsed if elapsed else 0
+    print(f"✅ Imported {total_inserted} new plays from {total_read} records in {elapsed:.1f}s ({rate:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
 from datetime import datetime
 import json
+from spotify_api import remember_track
+from history_store import history_store, ingest_recently_played
 
 # Load environment variables
 load_dotenv()
@@ -74,6 +76,8 @@ def get_last_played_song(sp):
         # Extract the last played track
         last_track = results['items'][0]
         track = last_track['track']
+        # Share the full track object with the other entry points
+        remember_track(track)
         
         # Format the track information
         song_info = {
@@ -156,6 +160,19 @@ def main():
                 json.dump(song_info, f, indent=2)
             print("💾 Song info saved to 'last_song.json'")
         
+        # Save every play since the last run to the local history
+        try:
+            new_plays = ingest_recently_played(
+                lambda after: sp.current_user_recently_played(limit=50, after=after), history_store,
+                fetch_artists=lambda artist_ids: [
+                    artist for i in range(0, len(artist_ids), 50)
+                    for artist in sp.artists(artist_ids[i:i + 50])['artists']
+                ]
+            )
+            print(f"📚 {len(new_plays)} new play(s) saved to history")
+        except Exception as e:
+            print(f"❌ History ingestion failed: {e}")
+        
     except Exception as e:
         print(f"❌ An error occurred: {str(e)}")
 
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Listening statistics from the local play history
+
+Top tracks, artists, genres and total listening time over the last 24
+hours, 7 days, 30 days or all time. The numbers come from aggregates the
+history store maintains on every insert, and results are cached until new
+plays arrive, so repeated reads are constant time.
+
+Usage:
+    python listening_stats.py --window 7d --limit 10
+"""
+
+import time
+import argparse
+import threading
+from history_store import history_store
+
+WINDOWS = {
+    '24h': 24 * 60 * 60,
+    '7d': 7 * 24 * 60 * 60,
+    '30d': 30 * 24 * 60 * 60,
+    'all': None
+}
+DEFAULT_WINDOW = '7d'
+DEFAULT_LIMIT = 10
+
+# Sliding windows move even without new plays; recompute at most this often
+MAX_AGE = 60
+
+
+def format_ms(ms):
+    """Format a duration as e.g. 12h 05m"""
+    minutes = ms // 60000
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
+class StatsEngine:
+    """Serves listening statistics, caching each result until the history changes"""
+
+    def __init__(self, store=history_store, max_age=MAX_AGE):
+        self.store = store
+        self.max_age = max_age
+        self._cache = {}  # (window, limit) -> (version, computed_at, stats)
+        self._lock = threading.Lock()
+
+    def get(self, window=DEFAULT_WINDOW, limit=DEFAULT_LIMIT):
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown window {window!r}; use one of {', '.join(WINDOWS)}")
+
+        version = self.store.version()
+        now = time.time()
+        cached = self._cache.get((window, limit))
+        if cached and cached[0] == version and (window == 'all' or now - cached[1] < self.max_age):
+            return cached[2]
+
+        stats = self._compute(window, limit, now)
+        with self._lock:
+            self._cache[(window, limit)] = (version, now, stats)
+        return stats
+
+    def _compute(self, window, limit, now):
+        seconds = WINDOWS[window]
+        since_ms = int((now - seconds) * 1000) if seconds else None
+
+        totals = self.store.top('total', since_ms, limit=1)
+        total = totals[0] if totals else {"plays": 0, "ms": 0}
+        return {
+            "window": window,
+            "total_plays": total["plays"],
+            "total_ms": total["ms"],
+            "total_time": format_ms(total["ms"]),
+            "top_tracks": self.store.top('track', since_ms, limit),
+            "top_artists": self.store.top('artist', since_ms, limit),
+            "top_genres": self.store.top('genre', since_ms, limit),
+            "generated_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now))
+        }
+
+
+stats_engine = StatsEngine()
+
+
+def format_stats(stats):
+    """Format statistics for display"""
+    output = f"""
+📊 Listening Stats ({stats['window']})
+{'=' * 40}
+🎧 Plays: {stats['total_plays']}
+⏱️  Listening time: {stats['total_time']}
+"""
+    for title, key in (("🎶 Top tracks", 'top_tracks'), ("👨‍🎤 Top artists", 'top_artists'), ("🏷️  Top genres", 'top_genres')):
+        output += f"\n{title}\n"
+        if not stats[key]:
+            output += "   (none yet)\n"
+        for i, entry in enumerate(stats[key], 1):
+            output += f"  {i:2d}. {entry['name']} - {entry['plays']} plays ({format_ms(entry['ms'])})\n"
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show listening statistics from the local play history")
+    parser.add_argument('--window', choices=list(WINDOWS), default=DEFAULT_WINDOW)
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    print(format_stats(stats_engine.get(args.window, args.limit)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events broadcaster for live song updates
+
+The background updater publishes here only when the track changes; every
+open /api/stream connection waits on the same condition and wakes up once
+per change instead of polling.
+"""
+
+import threading
+import time
+
+# Comment line sent while idle so proxies keep the connection open
+HEARTBEAT_INTERVAL = 15
+
+# Tell EventSource how long to wait before reconnecting (ms)
+RETRY_MS = 5000
+
+
+class SongEventStream:
+    """Holds the latest song event and wakes up subscribers when it changes"""
+
+    def __init__(self, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.heartbeat_interval = heartbeat_interval
+        self.subscribers = 0
+        # Start from the clock so ids from before a restart never match
+        self._event_id = int(time.time() * 1000)
+        self._payload = None
+        self._condition = threading.Condition()
+
+    @property
+    def event_id(self):
+        return self._event_id
+
+    def publish(self, payload):
+        """Publish a pre-serialized JSON song payload to every subscriber"""
+        with self._condition:
+            self._event_id += 1
+            self._payload = payload
+            self._condition.notify_all()
+
+    def _wait_for_change(self, seen_id):
+        """Block until an event newer than seen_id exists or the heartbeat is due"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._payload is not None and self._event_id != seen_id,
+                timeout=self.heartbeat_interval
+            )
+            return self._event_id, self._payload
+
+    def stream(self, last_event_id=None):
+        """
+        Generate SSE frames for one client.
+
+        A client resuming with the current Last-Event-ID gets nothing until
+        the next change; any other id (including one from before a server
+        restart) gets the current song right away.
+        """
+        try:
+            seen_id = int(last_event_id) if last_event_id else -1
+        except ValueError:
+            seen_id = -1
+
+        with self._condition:
+            self.subscribers += 1
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                event_id, payload = self._wait_for_change(seen_id)
+                if event_id != seen_id and payload is not None:
+                    seen_id = event_id
+                    yield f"id: {event_id}\nevent: song\ndata: {payload}\n\n"
+                else:
+                    yield ": heartbeat\n\n"
+        finally:
+            with self._condition:
+                self.subscribers -= 1
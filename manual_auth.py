@@ -4,11 +4,12 @@ Manual OAuth handler for Spotify in Codespaces
 """
 
 import os
-import requests
+import spotify_api
 import json
 from dotenv import load_dotenv
 from urllib.parse import urlencode
 import base64
+from spotify_api import remember_track
 
 load_dotenv()
 
@@ -40,7 +41,8 @@ def exchange_code_for_token(auth_code):
         'redirect_uri': redirect_uri
     }
     
-    response = requests.post(token_url, headers=headers, data=data)
+    # The code is single-use: a retried exchange would only fail with invalid_grant
+    response = spotify_api.post(token_url, headers=headers, data=data, retry=False)
     
     if response.status_code == 200:
         return response.json()
@@ -58,12 +60,14 @@ def get_last_played_song(access_token):
     
     # Get recently played tracks
     url = "https://api.spotify.com/v1/me/player/recently-played?limit=1"
-    response = requests.get(url, headers=headers)
+    response = spotify_api.get(url, headers=headers)
     
     if response.status_code == 200:
         data = response.json()
         if data['items']:
             track = data['items'][0]['track']
+            # Share the full track object with the other entry points
+            remember_track(track)
             return {
                 'song_name': track['name'],
                 'artist': ', '.join([artist['name'] for artist in track['artists']]),
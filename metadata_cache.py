@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Metadata cache for Spotify track and artist objects
+
+Album art, release dates and genres almost never change, so every
+enrichment path shares these caches instead of refetching them. Lookups go
+through an in-process LRU first and then a small SQLite file that is shared
+by the CLI, the exporter and the web server.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Track and artist objects are effectively static; a day is plenty fresh
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1024
+
+# Lives next to .spotify_cache so every entry point finds the same file
+DEFAULT_STORE_PATH = os.getenv('METADATA_CACHE_PATH', '.metadata_cache.sqlite')
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with a per-entry time-to-live.
+
+    Keys are Spotify ids. Least recently used entries are evicted once
+    `max_entries` is reached; expired entries are dropped on access.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entry if full"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return hit/miss/eviction counters"""
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class MetadataStore:
+    """
+    Persistent metadata store backed by SQLite.
+
+    Safe to share between processes (WAL journal plus a busy timeout) and
+    between threads (one connection per thread). A locked or busy database
+    only skips the one lookup or write; any other SQLite error disables the
+    store for the rest of the process instead of breaking the caller.
+    Expired rows are purged once per process, on the first connection.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.enabled = True
+        self._local = threading.local()
+        self._purged = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS metadata ('
+                ' kind TEXT NOT NULL,'
+                ' id TEXT NOT NULL,'
+                ' data TEXT NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' PRIMARY KEY (kind, id))'
+            )
+            conn.commit()
+            self._local.conn = conn
+            if not self._purged:
+                self._purged = True
+                self.purge_expired()
+        return conn
+
+    def _failed(self, error):
+        """Skip the operation on a transient error, disable the store on anything else"""
+        message = str(error).lower()
+        if isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message):
+            print(f"⚠️ Metadata store busy ({self.path}): {error}")
+            return
+        print(f"⚠️ Metadata store disabled ({self.path}): {error}")
+        self.enabled = False
+
+    def get(self, kind, key):
+        """Return the stored object, or None if missing or expired"""
+        if not self.enabled:
+            return None
+        try:
+            row = self._connect().execute(
+                'SELECT data, expires_at FROM metadata WHERE kind = ? AND id = ?',
+                (kind, key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._failed(e)
+            return None
+        if row is None or time.time() >= row[1]:
+            return None
+        return json.loads(row[0])
+
+    def set(self, kind, key, value, ttl=None):
+        """Insert or replace an object"""
+        if not self.enabled:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO metadata (kind, id, data, expires_at) VALUES (?, ?, ?, ?)',
+                    (kind, key, json.dumps(value), expires_at)
+                )
+        except sqlite3.Error as e:
+            self._failed(e)
+
+    def purge_expired(self):
+        """Delete expired rows, returning how many were removed"""
+        if not self.enabled:
+            return 0
+        try:
+            conn = self._connect()
+            with conn:
+                return conn.execute('DELETE FROM metadata WHERE expires_at <= ?', (time.time(),)).rowcount
+        except sqlite3.Error as e:
+            self._failed(e)
+            return 0
+
+
+class ReadThroughCache:
+    """An in-process TTLCache backed by one kind of the persistent store"""
+
+    def __init__(self, kind, memory, store):
+        self.kind = kind
+        self.memory = memory
+        self.store = store
+        self.store_hits = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None:
+            value = self.store.get(self.kind, key)
+            if value is not None:
+                self.store_hits += 1
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.store.set(self.kind, key, value)
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats["store_hits"] = self.store_hits
+        return stats
+
+
+# Shared by every enrichment path in this process
+metadata_store = MetadataStore()
+track_cache = ReadThroughCache('track', TTLCache(), metadata_store)
+artist_cache = ReadThroughCache('artist', TTLCache(), metadata_store)
+album_cache = ReadThroughCache('album', TTLCache(), metadata_store)
+palette_cache = ReadThroughCache('palette', TTLCache(), metadata_store)
+
+
+def cache_stats():
+    """Counters for all shared caches"""
+    return {
+        "tracks": track_cache.stats(),
+        "artists": artist_cache.stats(),
+        "albums": album_cache.stats(),
+        "palettes": palette_cache.stats()
+    }
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+"Now playing" SVG badge
+
+Renders song, artist and a small cover thumbnail into a self-contained
+SVG (the thumbnail is embedded, since README and profile embeds won't load
+external images). Rendered badges are cached by track id and theme, so
+serving an embed is a dictionary lookup instead of templating. The server
+never downloads a cover while answering a request: until the thumbnail is
+on disk a badge without it is served (and cached briefly) while the cover
+is fetched in the background.
+"""
+
+import time
+import base64
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape, quoteattr
+from album_art import album_art_cache
+from snapshot import make_etag
+
+THEMES = {
+    'dark': {'background': '#121212', 'text': '#ffffff', 'muted': '#b3b3b3', 'accent': '#1db954'},
+    'light': {'background': '#ffffff', 'text': '#111827', 'muted': '#6b7280', 'accent': '#1db954'},
+}
+# 'cover' uses the album's palette when one is known, else the dark theme
+THEME_NAMES = (*THEMES, 'cover')
+DEFAULT_THEME = 'dark'
+
+THUMBNAIL_SIZE = 64
+WIDTH = 380
+HEIGHT = 88
+MAX_SONG_CHARS = 34
+MAX_ARTIST_CHARS = 42
+
+MAX_CACHED_BADGES = 64
+# A badge rendered without its thumbnail is re-rendered after this many seconds
+PLACEHOLDER_TTL = 30
+
+
+def truncate(text, limit):
+    text = text or ''
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+
+def track_id_of(song):
+    """Spotify track id of a song payload (from its external URL)"""
+    url = song.get('external_url') or ''
+    return url.split('/track/')[1].split('?')[0] if '/track/' in url else None
+
+
+def theme_colors(theme, song):
+    if theme == 'cover' and song and song.get('palette'):
+        palette = song['palette']
+        return {'background': palette['dominant'], 'text': palette['text'],
+                'muted': palette['text'], 'accent': palette['accent']}
+    return THEMES.get(theme, THEMES[DEFAULT_THEME])
+
+
+def thumbnail_data_uri(song, download=True):
+    """The cover thumbnail as a data: URI (None if unavailable, or not on disk and download is False)"""
+    album_id = song.get('album_id')
+    if not album_id:
+        return None
+    if download:
+        path = album_art_cache.get(album_id, THUMBNAIL_SIZE, song.get('cover_images'))
+    else:
+        path = album_art_cache.cached_path(album_id, THUMBNAIL_SIZE)
+    if path is None:
+        return None
+    with open(path, 'rb') as f:
+        return 'data:image/jpeg;base64,' + base64.b64encode(f.read()).decode('ascii')
+
+
+def render_badge(song, theme=DEFAULT_THEME, thumbnail=None):
+    """SVG bytes for a song payload (None or an error payload renders an idle badge)"""
+    colors = theme_colors(theme, song)
+    if song and not song.get('error'):
+        title = truncate(song.get('song_name'), MAX_SONG_CHARS)
+        subtitle = truncate(song.get('artist'), MAX_ARTIST_CHARS)
+        label = f"Last played on Spotify: {song.get('song_name')} by {song.get('artist')}"
+    else:
+        title, subtitle = 'Nothing played yet', 'Spotify'
+        label = 'Nothing played on Spotify yet'
+
+    if thumbnail:
+        cover = (f'<image x="12" y="12" width="64" height="64" clip-path="url(#cover)" '
+                 f'preserveAspectRatio="xMidYMid slice" href={quoteattr(thumbnail)}/>')
+    else:
+        cover = f'<rect x="12" y="12" width="64" height="64" rx="6" fill="{colors["muted"]}" fill-opacity="0.25"/>'
+
+    svg = f'''<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" viewBox="0 0 {WIDTH} {HEIGHT}" role="img" aria-label={quoteattr(label)}>
+<title>{escape(label)}</title>
+<defs><clipPath id="cover"><rect x="12" y="12" width="64" height="64" rx="6"/></clipPath></defs>
+<rect width="{WIDTH}" height="{HEIGHT}" rx="10" fill="{colors['background']}"/>
+{cover}
+<g font-family="-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Helvetica,Arial,sans-serif">
+<text x="90" y="30" font-size="10" font-weight="600" letter-spacing="1" fill="{colors['accent']}">LAST PLAYED</text>
+<text x="90" y="52" font-size="15" font-weight="600" fill="{colors['text']}">{escape(title)}</text>
+<text x="90" y="71" font-size="13" fill="{colors['muted']}">{escape(subtitle)}</text>
+</g>
+</svg>
+'''
+    return svg.encode('utf-8')
+
+
+class BadgeCache:
+    """Rendered badges (body, etag) by track id and theme, least recently used evicted first"""
+
+    def __init__(self, max_entries=MAX_CACHED_BADGES, placeholder_ttl=PLACEHOLDER_TTL):
+        self.max_entries = max_entries
+        self.placeholder_ttl = placeholder_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (body, etag, expires_at or None)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='badge')
+        self._pending = set()
+
+    def _fetch_thumbnail(self, album_id, images):
+        """Download a cover in the background, at most once per album at a time"""
+        with self._lock:
+            if album_id in self._pending:
+                return
+            self._pending.add(album_id)
+        self._executor.submit(self._run_fetch, album_id, images)
+
+    def _run_fetch(self, album_id, images):
+        try:
+            album_art_cache.get(album_id, THUMBNAIL_SIZE, images)
+        except Exception as e:
+            print(f"❌ Badge thumbnail failed for {album_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(album_id)
+
+    def get(self, song, theme=DEFAULT_THEME):
+        """(body, etag) of the badge for a song payload, rendering it on a miss"""
+        theme = theme if theme in THEME_NAMES else DEFAULT_THEME
+        song = song or {}
+        palette = song.get('palette') if theme == 'cover' else None
+        # The cover theme changes once the palette arrives
+        key = (track_id_of(song) or song.get('song_name'), theme, palette and palette['dominant'])
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[2] is None or entry[2] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[:2]
+            self.misses += 1
+
+        thumbnail = thumbnail_data_uri(song, download=False) if key[0] else None
+        expires_at = None
+        if key[0] and not thumbnail and song.get('album_id') and song.get('cover_images'):
+            # Serve it without the cover for now; a later render picks the thumbnail up
+            self._fetch_thumbnail(song['album_id'], song['cover_images'])
+            expires_at = now + self.placeholder_ttl
+        body = render_badge(song if key[0] else None, theme, thumbnail)
+        entry = (body, make_etag(body), expires_at)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry[:2]
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared by the web server
+badge_cache = BadgeCache()
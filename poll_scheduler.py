@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Adaptive poll scheduler for the recently-played endpoint
+
+Instead of a fixed 30 second cadence, the next poll is timed from the
+latest play. Spotify's played_at marks when that track stopped, so the
+next track started about then; assuming it is about as long as the last
+one, sleep until it should end (but never longer than a minute, since the
+next track may well be shorter), poll quickly around that boundary, and
+back off exponentially once the boundary has passed with nothing new.
+"""
+
+import time
+from datetime import datetime
+
+DEFAULT_INTERVAL = 30
+MIN_INTERVAL = 10
+MAX_INTERVAL = 300
+
+# Extra slack after the expected end of a track before polling
+BOUNDARY_GRACE = 5
+
+# How long to keep polling at MIN_INTERVAL after an expected boundary
+FAST_WINDOW = 60
+
+# Longest sleep while a track is probably still playing; the guess of its length may be way off
+MAX_TRACK_INTERVAL = 60
+
+
+def parse_played_at(played_at):
+    """Convert Spotify's ISO played_at timestamp to epoch seconds"""
+    if not played_at:
+        return None
+    try:
+        return datetime.fromisoformat(played_at.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class PollScheduler:
+    """Chooses how long to wait before the next recently-played poll"""
+
+    def __init__(self, base_interval=DEFAULT_INTERVAL, min_interval=MIN_INTERVAL,
+                 max_interval=MAX_INTERVAL, grace=BOUNDARY_GRACE, fast_window=FAST_WINDOW,
+                 max_track_interval=MAX_TRACK_INTERVAL):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.grace = grace
+        self.fast_window = fast_window
+        self.max_track_interval = max_track_interval
+        self.idle_polls = 0
+        self.interval = base_interval
+        self.next_poll_at = None
+
+    def next_interval(self, played_at=None, duration_ms=None, changed=False, now=None):
+        """
+        Record the outcome of a poll and return seconds until the next one.
+
+        played_at/duration_ms describe the latest play (played_at is when
+        it ended); pass None for both when the poll failed or returned
+        nothing.
+        """
+        now = time.time() if now is None else now
+        if changed:
+            self.idle_polls = 0
+
+        ended = parse_played_at(played_at)
+        # The following track started when this one ended; expect it to take as long
+        boundary = ended + duration_ms / 1000 if ended and duration_ms else None
+
+        if boundary is not None and now < boundary:
+            # Probably mid-track: only a skip (or a shorter track) shows up before the boundary
+            interval = min(boundary - now + self.grace, self.max_track_interval)
+        elif boundary is not None and now - boundary < self.fast_window:
+            # Right after the expected boundary the next play is likely
+            interval = self.min_interval
+        else:
+            # Idle (or unknown): back off exponentially, counting from the end of the fast window
+            if not changed:
+                self.idle_polls += 1
+            interval = self.base_interval * 2 ** max(0, self.idle_polls - 1)
+
+        self.interval = max(self.min_interval, min(self.max_interval, interval))
+        self.next_poll_at = now + self.interval
+        return self.interval
+
+    def stats(self):
+        return {
+            "interval_seconds": round(self.interval, 1),
+            "next_poll_at": datetime.fromtimestamp(self.next_poll_at).isoformat() if self.next_poll_at else None,
+            "idle_polls": self.idle_polls
+        }
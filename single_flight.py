@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Request coalescing for expensive upstream fetches
+
+Concurrent callers share one in-flight call instead of each starting
+their own, and nobody waits longer than their deadline for it.
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call at a time; everyone else waits for its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._call = None
+
+    @property
+    def in_flight(self):
+        return self._call is not None
+
+    def run(self, fn, timeout):
+        """
+        Run fn (or join the call already running) and wait up to timeout.
+
+        The call itself runs on a background thread, so it keeps going and
+        finishes even if every caller has given up. Returns a
+        (finished, result) tuple; exceptions raised by fn are re-raised in
+        every waiting caller.
+        """
+        with self._lock:
+            call = self._call
+            if call is None:
+                call = self._call = _Call()
+                threading.Thread(target=self._execute, args=(call, fn), daemon=True).start()
+
+        if not call.done.wait(timeout):
+            return False, None
+        if call.error is not None:
+            raise call.error
+        return True, call.result
+
+    def _execute(self, call, fn):
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._call = None
+            call.done.set()
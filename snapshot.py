@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Immutable song snapshots for the web app
+
+The background updater builds a new snapshot for every change and swaps it
+in with a single reference assignment. Request threads only ever read that
+reference, so they never see a half-updated song and need no lock.
+Snapshots are also saved to disk so a restarted server can answer right away.
+"""
+
+import copy
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from file_utils import atomic_write_json
+
+
+def make_etag(body):
+    """Strong ETag for a response body"""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+@dataclass(frozen=True)
+class SongSnapshot:
+    """A song payload frozen together with its pre-rendered JSON and ETag"""
+
+    data: MappingProxyType
+    body: bytes
+    etag: str
+    created_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def build(cls, data):
+        """Freeze a copy of data and render it once"""
+        frozen = MappingProxyType(copy.deepcopy(data))
+        body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        return cls(data=frozen, body=body, etag=make_etag(body))
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def to_dict(self):
+        """A mutable deep copy of the payload"""
+        return copy.deepcopy(dict(self.data))
+
+
+def save_snapshot(path, snapshot, **extra):
+    """Persist a snapshot (plus any extra state) to path atomically"""
+    state = {"data": dict(snapshot.data), "created_at": snapshot.created_at}
+    state.update(extra)
+    try:
+        atomic_write_json(path, state, indent=None)
+    except (OSError, TypeError) as e:
+        print(f"⚠️ Could not save snapshot to {path}: {e}")
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot saved by save_snapshot().
+
+    Returns (snapshot, extra_state), or (None, {}) if there is nothing usable.
+    """
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+        data = state.pop('data')
+        created_at = state.pop('created_at', time.time())
+    except FileNotFoundError:
+        return None, {}
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ Ignoring unreadable snapshot {path}: {e}")
+        return None, {}
+
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    snapshot = SongSnapshot(
+        data=MappingProxyType(data), body=body, etag=make_etag(body), created_at=created_at
+    )
+    return snapshot, state
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Shared Spotify Web API helpers
+
+All Spotify calls go through one pooled keep-alive session with timeouts
+and retries, and share a process-wide rate-limit budget that honors
+Spotify's Retry-After header. Track and artist lookups go through the metadata caches, so
+repeat listens don't cost any network round-trips.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from metadata_cache import track_cache, artist_cache, album_cache
+
+API_BASE = 'https://api.spotify.com/v1'
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (3.05, 10)
+
+# Retry 5xx responses and connection errors with jittered exponential backoff
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8
+RETRY_STATUSES = {500, 502, 503, 504}
+
+# Shared request budget: steady requests per second and burst size
+RATE_LIMIT_PER_SECOND = 5
+RATE_LIMIT_BURST = 10
+
+# Spotify's limit for /tracks?ids= and /artists?ids=
+BATCH_SIZE = 50
+
+# Don't block a caller for longer than this when Spotify asks us to back off
+MAX_THROTTLE_WAIT = 60
+
+_session = None
+_session_lock = threading.Lock()
+
+# Runs independent lookups concurrently. Only leaf requests go to the pool:
+# a task that waited on other tasks in the same pool could deadlock it.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='spotify-api')
+
+
+def _on_pool_thread():
+    return threading.current_thread().name.startswith('spotify-api')
+
+
+class SpotifyUnauthorized(Exception):
+    """Raised when Spotify rejects the access token (HTTP 401)"""
+
+
+class SpotifyRateLimited(requests.RequestException):
+    """Raised when we are throttled for longer than a caller is willing to wait"""
+
+    def __init__(self, retry_in):
+        super().__init__(f"Rate limited by Spotify, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class RateLimiter:
+    """
+    Process-wide token bucket that also understands HTTP 429.
+
+    Every request takes a token from the bucket. When Spotify answers 429,
+    `throttle()` pauses all callers together until Retry-After has passed,
+    and the time spent paused is recorded.
+    """
+
+    def __init__(self, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.throttle_events = 0
+        self.throttled_seconds = 0.0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait=MAX_THROTTLE_WAIT):
+        """Block until a request may be sent, or raise SpotifyRateLimited"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                    if wait > max_wait:
+                        raise SpotifyRateLimited(wait)
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self, retry_after):
+        """Pause every caller for retry_after seconds"""
+        with self._lock:
+            now = time.monotonic()
+            until = now + retry_after
+            if until > self._paused_until:
+                # Only count the part that extends an existing pause
+                self.throttled_seconds += until - max(now, self._paused_until)
+                self._paused_until = until
+            self.throttle_events += 1
+            self._tokens = 0
+
+    def stats(self):
+        remaining = max(0.0, self._paused_until - time.monotonic())
+        return {
+            "throttled": remaining > 0,
+            "throttled_for": round(remaining, 1),
+            "throttle_events": self.throttle_events,
+            "throttled_seconds": round(self.throttled_seconds, 1)
+        }
+
+
+rate_limiter = RateLimiter()
+
+
+def _retry_after(response):
+    """Seconds to wait according to a 429 response's Retry-After header"""
+    try:
+        return max(1.0, float(response.headers.get('Retry-After', 1)))
+    except ValueError:
+        return 1.0
+
+
+def get_session():
+    """Return the process-wide pooled requests.Session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff delay for the given attempt"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def request(method, url, retry=True, **kwargs):
+    """
+    Send a request over the shared session.
+
+    Applies the default timeouts, waits for the shared rate-limit budget
+    and retries connection errors, 429 and 5xx responses. The last response
+    is returned even if it is still an error; the last connection error is
+    re-raised. Pass retry=False for requests that must not be sent twice,
+    such as redeeming a single-use authorization code.
+    """
+    kwargs.setdefault('timeout', TIMEOUT)
+    session = get_session()
+    retries = MAX_RETRIES if retry else 0
+
+    for attempt in range(retries + 1):
+        last_attempt = attempt == retries
+        rate_limiter.acquire()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if last_attempt:
+                raise
+        else:
+            if response.status_code == 429:
+                retry_after = _retry_after(response)
+                print(f"⏳ Rate limited by Spotify, backing off {retry_after:.0f}s")
+                rate_limiter.throttle(retry_after)
+                if last_attempt:
+                    return response
+                response.close()
+                # The limiter already holds everyone back until Retry-After
+                continue
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            response.close()
+        time.sleep(_backoff(attempt))
+
+
+def get(url, retry=True, **kwargs):
+    return request('GET', url, retry=retry, **kwargs)
+
+
+def post(url, retry=True, **kwargs):
+    return request('POST', url, retry=retry, **kwargs)
+
+
+def _get_json(path, access_token):
+    """GET an API path, returning the decoded JSON or None on error"""
+    headers = {'Authorization': f'Bearer {access_token}'}
+    response = get(f'{API_BASE}{path}', headers=headers)
+
+    if response.status_code == 401:
+        raise SpotifyUnauthorized(path)
+    elif response.status_code != 200:
+        print(f"❌ Spotify API error for {path}: {response.status_code}")
+        return None
+    return response.json()
+
+
+def get_track(track_id, access_token):
+    """Get a full track object, served from cache when possible"""
+    track = track_cache.get(track_id)
+    if track is None:
+        track = _get_json(f'/tracks/{track_id}', access_token)
+        if track is not None:
+            track_cache.set(track_id, track)
+            remember_album(track.get('album'))
+    return track
+
+
+def get_artist(artist_id, access_token):
+    """Get a full artist object, served from cache when possible"""
+    artist = artist_cache.get(artist_id)
+    if artist is None:
+        artist = _get_json(f'/artists/{artist_id}', access_token)
+        if artist is not None:
+            artist_cache.set(artist_id, artist)
+    return artist
+
+
+def _get_many(path, key, ids, cache, access_token):
+    """
+    Batch lookup through a cache.
+
+    Ids missing from the cache are fetched in chunks of BATCH_SIZE, with
+    the chunks running concurrently. Returns objects in the order of `ids`,
+    with None for ids Spotify didn't return.
+    """
+    results = {}
+    missing = []
+    for object_id in dict.fromkeys(ids):
+        cached = cache.get(object_id)
+        if cached is None:
+            missing.append(object_id)
+        else:
+            results[object_id] = cached
+
+    chunks = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+    urls = [f"{path}?ids={','.join(chunk)}" for chunk in chunks]
+    if _on_pool_thread() or len(urls) <= 1:
+        # Never wait on the pool from inside it
+        pages = (_get_json(url, access_token) for url in urls)
+    else:
+        futures = [_executor.submit(_get_json, url, access_token) for url in urls]
+        pages = (future.result() for future in futures)
+    for data in pages:
+        for obj in (data or {}).get(key, []):
+            if obj:
+                cache.set(obj['id'], obj)
+                results[obj['id']] = obj
+
+    return [results.get(object_id) for object_id in ids]
+
+
+def get_tracks(track_ids, access_token):
+    """Get several full track objects with as few batch requests as possible"""
+    return _get_many('/tracks', 'tracks', track_ids, track_cache, access_token)
+
+
+def get_artists(artist_ids, access_token):
+    """Get several full artist objects with as few batch requests as possible"""
+    return _get_many('/artists', 'artists', artist_ids, artist_cache, access_token)
+
+
+def get_track_with_artists(track_id, access_token, artist_ids=None):
+    """
+    Get a track and all of its artists.
+
+    When the artist ids are already known (e.g. from a recently-played
+    item) the track and the artist batch are fetched concurrently, so the
+    whole enrichment costs about one round-trip.
+    """
+    if artist_ids and not _on_pool_thread():
+        # The track request goes to the pool; the artist batch runs here
+        track_future = _executor.submit(get_track, track_id, access_token)
+        artists = get_artists(artist_ids, access_token)
+        track = track_future.result()
+    elif artist_ids:
+        track = get_track(track_id, access_token)
+        artists = get_artists(artist_ids, access_token)
+    else:
+        track = get_track(track_id, access_token)
+        if track is None:
+            return None, []
+        artists = get_artists([a['id'] for a in track['artists']], access_token)
+    return track, [a for a in artists if a]
+
+
+def merge_genres(artists):
+    """Genres of all artists, de-duplicated, in artist order"""
+    return list(dict.fromkeys(g for artist in artists for g in artist.get('genres', [])))
+
+
+def get_recently_played_page(access_token, limit=50, after=None):
+    """Get one page of the user's recently played tracks"""
+    path = f'/me/player/recently-played?limit={limit}'
+    if after:
+        path += f'&after={after}'
+    return _get_json(path, access_token)
+
+
+def remember_track(track):
+    """Seed the track cache with a full track object we already have"""
+    if track and track.get('id'):
+        track_cache.set(track['id'], track)
+        remember_album(track.get('album'))
+
+
+def remember_album(album):
+    """Seed the album cache with the parts of an album object album art needs"""
+    if album and album.get('id') and album.get('images'):
+        album_cache.set(album['id'], {key: album.get(key) for key in ('id', 'name', 'images')})
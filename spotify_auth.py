@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Shared Spotify token handling
+
+Keeps access tokens in memory and refreshes them shortly before they expire,
+so callers don't hit the accounts service on every request. The user token
+is read from and written back to .spotify_cache.
+"""
+
+import os
+import abc
+import json
+import base64
+import threading
+import time
+import requests
+import spotify_api
+from dotenv import load_dotenv
+from file_utils import atomic_write_json
+
+load_dotenv()
+
+TOKEN_URL = 'https://accounts.spotify.com/api/token'
+CACHE_PATH = '.spotify_cache'
+
+# Refresh this many seconds before the token actually expires
+REFRESH_MARGIN = 300
+
+
+def basic_auth_header(client_id, client_secret):
+    """Build the Basic auth header value used by the accounts service"""
+    auth_string = f"{client_id}:{client_secret}"
+    auth_bytes = auth_string.encode('ascii')
+    return 'Basic ' + base64.b64encode(auth_bytes).decode('ascii')
+
+
+class ManagedToken(abc.ABC):
+    """
+    In-memory access token with proactive, single-flight refresh.
+
+    The token is reused until it gets close to its expiry. Inside the
+    refresh margin the current token is still returned while a single
+    background refresh runs; once it has actually expired, callers block on
+    one shared refresh instead of each requesting their own token.
+
+    Subclasses implement `_request_token()`, returning the accounts
+    service's JSON response or None.
+    """
+
+    def __init__(self, refresh_margin=REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = None  # threading.Event while a refresh is in flight
+        self.last_refresh_failed = False
+
+    @property
+    def expires_at(self):
+        return self._expires_at
+
+    def is_valid(self):
+        return self._token is not None and time.time() < self._expires_at
+
+    def get(self):
+        """Return a valid access token, or None if Spotify refused one"""
+        now = time.time()
+        token, expires_at = self._token, self._expires_at
+
+        if token and now < expires_at - self.refresh_margin:
+            return token
+
+        if token and now < expires_at:
+            # Still usable - refresh in the background and keep going
+            self._start_refresh(background=True)
+            return token
+
+        # Expired or never fetched - wait for the shared refresh
+        done = self._start_refresh(background=False)
+        done.wait()
+        return self._token if time.time() < self._expires_at else None
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after a 401"""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
+
+    def _start_refresh(self, background):
+        """Start a refresh unless one is already running; return its Event"""
+        with self._lock:
+            if self._refreshing is not None:
+                return self._refreshing
+            done = self._refreshing = threading.Event()
+
+        if background:
+            threading.Thread(target=self._refresh, args=(done,), daemon=True).start()
+        else:
+            self._refresh(done)
+        return done
+
+    def _refresh(self, done):
+        try:
+            token_data = self._request_token()
+            # Only a refused refresh counts as failed; a network error is retried by the next get()
+            self.last_refresh_failed = not token_data
+            if token_data:
+                with self._lock:
+                    self._token = token_data['access_token']
+                    self._expires_at = time.time() + token_data.get('expires_in', 3600)
+                self._on_refreshed(token_data)
+        except requests.RequestException as e:
+            print(f"❌ Token request failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = None
+            done.set()
+
+    def _on_refreshed(self, token_data):
+        """Hook for subclasses that need to persist a new token"""
+
+    @abc.abstractmethod
+    def _request_token(self):
+        """The accounts service's JSON response for a new token, or None"""
+
+
+class ClientCredentialsToken(ManagedToken):
+    """Client-credentials token for public catalog data"""
+
+    def __init__(self, client_id=None, client_secret=None, refresh_margin=REFRESH_MARGIN):
+        super().__init__(refresh_margin)
+        self.client_id = client_id or os.getenv('SPOTIPY_CLIENT_ID')
+        self.client_secret = client_secret or os.getenv('SPOTIPY_CLIENT_SECRET')
+
+    def _request_token(self):
+        headers = {
+            'Authorization': basic_auth_header(self.client_id, self.client_secret),
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        data = {'grant_type': 'client_credentials'}
+
+        response = spotify_api.post(TOKEN_URL, headers=headers, data=data)
+
+        if response.status_code == 200:
+            return response.json()
+        print(f"❌ Client token request failed: {response.status_code}")
+        return None
+
+
+class UserToken(ManagedToken):
+    """
+    User token backed by .spotify_cache.
+
+    Refreshes itself with the stored refresh token before it expires and
+    writes the new token back to the cache file atomically, so every
+    process that reads the cache picks it up.
+    """
+
+    def __init__(self, cache_path=CACHE_PATH, client_id=None, client_secret=None,
+                 refresh_margin=REFRESH_MARGIN):
+        super().__init__(refresh_margin)
+        self.cache_path = cache_path
+        self.client_id = client_id or os.getenv('SPOTIPY_CLIENT_ID')
+        self.client_secret = client_secret or os.getenv('SPOTIPY_CLIENT_SECRET')
+        self._cache = {}
+
+    @property
+    def refresh_token(self):
+        return self._cache.get('refresh_token')
+
+    def can_refresh(self):
+        return bool(self.refresh_token) and not self.last_refresh_failed
+
+    def load(self):
+        """
+        Load the token from the cache file.
+
+        Returns True if a usable token is available, either because the
+        cached one is still valid or because it can be refreshed.
+        """
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            print("⚠️ No user token found.")
+            return False
+        except ValueError as e:
+            print(f"❌ Could not read {self.cache_path}: {e}")
+            return False
+
+        # Our scripts store created_at + expires_in; spotipy stores expires_at
+        expires_at = cache.get('expires_at')
+        if expires_at is None:
+            expires_at = cache.get('created_at', time.time()) + cache.get('expires_in', 3600)
+
+        with self._lock:
+            self._cache = cache
+            self._token = cache.get('access_token')
+            self._expires_at = expires_at
+
+        if self.is_valid():
+            return True
+        if self.refresh_token:
+            print("🔄 Access token expired, refreshing...")
+            return self.get() is not None
+        print("⚠️ User token expired and no refresh token is available.")
+        return False
+
+    def _request_token(self):
+        if not self.refresh_token:
+            return None
+
+        headers = {
+            'Authorization': basic_auth_header(self.client_id, self.client_secret),
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        data = {
+            'grant_type': 'refresh_token',
+            'refresh_token': self.refresh_token
+        }
+
+        response = spotify_api.post(TOKEN_URL, headers=headers, data=data)
+
+        if response.status_code == 200:
+            print("✅ Token refreshed successfully!")
+            return response.json()
+        print(f"❌ Token refresh failed: {response.status_code}")
+        return None
+
+    def _on_refreshed(self, token_data):
+        now = time.time()
+        cache_data = {
+            'access_token': token_data['access_token'],
+            # Spotify only sometimes rotates the refresh token
+            'refresh_token': token_data.get('refresh_token') or self.refresh_token,
+            'expires_in': token_data.get('expires_in', 3600),
+            'created_at': now,
+            'expires_at': now + token_data.get('expires_in', 3600),
+            'scope': token_data.get('scope') or self._cache.get('scope', 'user-read-recently-played')
+        }
+        self._cache = cache_data
+        try:
+            atomic_write_json(self.cache_path, cache_data)
+        except OSError as e:
+            print(f"⚠️ Could not update {self.cache_path}: {e}")
@@ -2,20 +2,42 @@
 """
 Real-time Spotify Last Song Fetcher with Web Interface
 
-This version automatically updates with your recently played songs every 30 seconds,
+This version automatically updates with your recently played songs, polling
+Spotify on an adaptive schedule driven by track length and playback state,
 fetches enhanced song details including cover art and genres,
 and serves a beautiful web interface to display the information.
 """
 
 import os
-import requests
+import sys
+import atexit
+import signal
+import spotify_api
 import json
 from dotenv import load_dotenv
 from datetime import datetime
-import base64
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request, send_file
 import threading
 import time
+from spotify_auth import ClientCredentialsToken, UserToken
+from metadata_cache import cache_stats
+from live_updates import SongEventStream
+from poll_scheduler import PollScheduler
+from single_flight import SingleFlight
+from snapshot import SongSnapshot, make_etag, save_snapshot, load_snapshot
+from spotify_api import get_track_with_artists, get_artists, get_recently_played_page, merge_genres, remember_track, SpotifyUnauthorized
+from metadata_cache import album_cache
+from album_art import album_art_cache, THUMBNAIL_SIZES, ALBUM_ID
+from cover_palette import palette_worker
+from now_playing_badge import badge_cache, DEFAULT_THEME
+from history_store import history_store, ingest_recently_played, ms_to_iso
+from compact_history import CompactHistory
+from listening_stats import stats_engine, WINDOWS, DEFAULT_WINDOW, DEFAULT_LIMIT
+
+try:
+    import history_analytics
+except ImportError:  # numpy not installed
+    history_analytics = None
 
 load_dotenv()
 
@@ -26,49 +48,74 @@ CODESPACE_NAME = os.getenv('CODESPACE_NAME')
 app = Flask(__name__)
 
 # Global variables for real-time updates
-latest_song_data = None
-user_access_token = None
-token_expires_at = 0
+# Current SongSnapshot; replaced as a whole, never mutated
+song_snapshot = None
+
+# (track id, played_at) of the play behind song_snapshot
+last_play_key = None
+
+# Serializes snapshot swaps by the updater and by palette callbacks
+publish_lock = threading.RLock()
+
+# Saved on every change so a restart can serve the last song immediately
+SNAPSHOT_PATH = os.getenv('WEB_APP_SNAPSHOT_PATH', '.web_app_snapshot.json')
+last_checked = None
+
+# Pushes song changes to /api/stream subscribers
+song_events = SongEventStream()
+
+# Decides when the background updater polls next
+poll_scheduler = PollScheduler()
+
+# Compact copy of the play history, kept in step with history_store
+play_history = CompactHistory()
+play_history_version = None
+play_history_lock = threading.Lock()
+
+# (history version, tz offset, day) -> encoded /api/analytics body
+analytics_cache = {}
+
+# Cold-start /api/last-song requests share one fetch and wait at most this long
+initial_fetch = SingleFlight()
+COLD_START_DEADLINE = 5
+WARMING_UP_RETRY_AFTER = 2
+
+# Client-credentials token shared by all enrichment calls
+client_token = ClientCredentialsToken(CLIENT_ID, CLIENT_SECRET)
+
+# User token from .spotify_cache, refreshed before it expires
+user_token = UserToken(client_id=CLIENT_ID, client_secret=CLIENT_SECRET)
 
 def load_saved_token():
     """Load the saved access token from authentication"""
-    global user_access_token, token_expires_at
-    
-    # Try to load from .spotify_cache (spotipy cache)
-    try:
-        with open('.spotify_cache', 'r') as f:
-            cache = json.load(f)
-            user_access_token = cache.get('access_token')
-            expires_in = cache.get('expires_in', 3600)
-            created_at = cache.get('created_at', time.time())
-            token_expires_at = created_at + expires_in
-            
-            # Check if token is still valid
-            if time.time() >= token_expires_at:
-                print("⚠️ User token expired. Using fallback to last saved song.")
-                return False
-            return True
-    except FileNotFoundError:
-        print("⚠️ No user token found. Using fallback to last saved song.")
+    # Loads .spotify_cache and refreshes the token right away if it has expired
+    if not user_token.load():
+        print("⚠️ Using fallback to last saved song.")
         return False
+    return True
 
-def get_recently_played():
-    """Get recently played tracks from Spotify using user token"""
-    global user_access_token
-    
-    if not user_access_token:
+def get_latest_play():
+    """Get the raw most recent play item from Spotify using user token"""
+    access_token = user_token.get()
+    if not access_token:
         return None
         
-    headers = {'Authorization': f'Bearer {user_access_token}'}
+    headers = {'Authorization': f'Bearer {access_token}'}
     
     # Get recently played tracks (limit 1 for most recent)
-    response = requests.get(
-        'https://api.spotify.com/v1/me/player/recently-played?limit=1', 
-        headers=headers
-    )
+    try:
+        response = spotify_api.get(
+            'https://api.spotify.com/v1/me/player/recently-played?limit=1', 
+            headers=headers
+        )
+    except spotify_api.SpotifyRateLimited as e:
+        print(f"⏳ {e}")
+        return None
     
     if response.status_code == 401:
+        # Revoked or expired early - the next call refreshes it
         print("🔄 User token expired")
+        user_token.invalidate()
         return None
     elif response.status_code != 200:
         print(f"❌ Error fetching recent plays: {response.status_code}")
@@ -77,38 +124,47 @@ def get_recently_played():
     data = response.json()
     if not data.get('items'):
         return None
-        
+    
     item = data['items'][0]
-    track = item['track']
+    if play_key(item) != last_play_key:
+        # A new play already carries the full track object - no need to fetch it again
+        remember_track(item['track'])
+    return item
+
+def play_artist_ids(item):
+    """Artist ids of a recently-played item"""
+    return [artist['id'] for artist in item['track']['artists']]
+
+def play_key(item):
+    """Identify a play by track id and played_at, used for change detection"""
+    return (item['track']['id'], item['played_at'])
+
+def get_recently_played():
+    """Get recently played tracks from Spotify using user token"""
+    item = get_latest_play()
+    if not item:
+        return None
     
     # Get enhanced track details
-    return get_enhanced_track_details(track['id'], item['played_at'])
+    return get_enhanced_track_details(item['track']['id'], item['played_at'], play_artist_ids(item))
 
-def get_enhanced_track_details(track_id, played_at):
-    """Get enhanced track details including genres"""
+def get_enhanced_track_details(track_id, played_at, artist_ids=None):
+    """Get enhanced track details including genres of every artist"""
     # Use client credentials for public track data
     token = get_spotify_token()
     if not token:
         return None
         
-    headers = {'Authorization': f'Bearer {token}'}
-    
-    # Get detailed track information
-    track_response = requests.get(f'https://api.spotify.com/v1/tracks/{track_id}', headers=headers)
-    
-    if track_response.status_code != 200:
+    try:
+        # Track and all artists in parallel (or right after, if artist ids are unknown)
+        track_data, artists = get_track_with_artists(track_id, token, artist_ids)
+        if track_data is None:
+            return None
+    except SpotifyUnauthorized:
+        client_token.invalidate()
         return None
     
-    track_data = track_response.json()
-    
-    # Get artist details for genres
-    artist_id = track_data['artists'][0]['id']
-    artist_response = requests.get(f'https://api.spotify.com/v1/artists/{artist_id}', headers=headers)
-    
-    genres = []
-    if artist_response.status_code == 200:
-        artist_data = artist_response.json()
-        genres = artist_data.get('genres', [])
+    genres = merge_genres(artists)
     
     # Format duration
     duration_ms = track_data['duration_ms']
@@ -116,7 +172,7 @@ def get_enhanced_track_details(track_id, played_at):
     minutes = duration_sec // 60
     seconds = duration_sec % 60
     
-    # Get the highest quality cover image
+    # Highest quality cover image; the page loads resized copies through /art
     cover_images = track_data['album']['images']
     cover_url = cover_images[0]['url'] if cover_images else None
     
@@ -124,9 +180,13 @@ def get_enhanced_track_details(track_id, played_at):
         "song_name": track_data['name'],
         "artist": ", ".join([artist['name'] for artist in track_data['artists']]),
         "album": track_data['album']['name'],
+        "album_id": track_data['album'].get('id'),
         "cover_image": cover_url,
+        "cover_images": cover_images,
         "genres": genres[:3] if genres else ["Unknown"],
+        "artist_genres": {artist['name']: artist.get('genres', []) for artist in artists},
         "duration": f"{minutes}:{seconds:02d}",
+        "duration_ms": duration_ms,
         "popularity": track_data['popularity'],
         "release_date": track_data['album']['release_date'],
         "external_url": track_data['external_urls']['spotify'],
@@ -135,58 +195,149 @@ def get_enhanced_track_details(track_id, played_at):
         "last_updated": datetime.now().isoformat()
     }
 
+def set_latest_song(data, key=None):
+    """Publish a new immutable snapshot of the current song and notify live subscribers"""
+    global song_snapshot, last_play_key, last_checked
+    with publish_lock:
+        snapshot = SongSnapshot.build(with_palette(data))
+        # A single reference assignment - readers see either the old or the new snapshot
+        song_snapshot = snapshot
+        last_play_key = key
+        last_checked = datetime.now().isoformat()
+        song_events.publish(snapshot.body.decode('utf-8'))
+        persist_snapshot()
+
+def with_palette(data):
+    """Add the cover palette if it is already known; otherwise compute it in the background"""
+    album_id = data.get('album_id')
+    if not album_id or data.get('palette'):
+        return data
+    palette = palette_worker.get_cached(album_id)
+    if palette:
+        return dict(data, palette=palette)
+    palette_worker.submit(album_id, data.get('cover_images'), apply_palette)
+    return data
+
+def apply_palette(album_id, palette):
+    """Republish the current song with its palette once the worker has it"""
+    with publish_lock:
+        snapshot = song_snapshot
+        if snapshot is None or snapshot.get('album_id') != album_id or snapshot.get('palette'):
+            return
+        set_latest_song(dict(snapshot.to_dict(), palette=palette), last_play_key)
+
+def persist_snapshot():
+    """Save the current snapshot for the next warm start"""
+    snapshot = song_snapshot
+    if snapshot is not None:
+        save_snapshot(SNAPSHOT_PATH, snapshot, play_key=last_play_key)
+
+def load_persisted_snapshot():
+    """Serve the snapshot from the previous run until the first real fetch lands"""
+    global song_snapshot, last_play_key
+    snapshot, state = load_snapshot(SNAPSHOT_PATH)
+    if snapshot is None:
+        return False
+    song_snapshot = snapshot
+    last_play_key = tuple(state['play_key']) if state.get('play_key') else None
+    song_events.publish(snapshot.body.decode('utf-8'))
+    return True
+
+def conditional_json(body, etag):
+    """Serve pre-serialized JSON, or 304 if the client already has this ETag"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def ingest_history():
+    """Append every play since the last ingestion to the local history store"""
+    access_token = user_token.get()
+    if not access_token:
+        return []
+    try:
+        new_plays = ingest_recently_played(
+            lambda after: get_recently_played_page(access_token, after=after), history_store,
+            fetch_artists=lambda artist_ids: get_artists(artist_ids, access_token)
+        )
+    except Exception as e:
+        print(f"❌ History ingestion error: {e}")
+        return []
+    if new_plays:
+        print(f"📚 {len(new_plays)} new play(s) saved to history")
+    return new_plays
+
+def sync_play_history():
+    """Bring the in-memory history up to date with the store (cheap when nothing changed)"""
+    global play_history, play_history_version
+    version = history_store.version()
+    if version == play_history_version:
+        return play_history
+    
+    with play_history_lock:
+        if version != play_history_version:
+            play_history.sync(history_store)
+            if len(play_history) != history_store.count():
+                # Older plays were imported - rebuild instead of appending
+                play_history = CompactHistory.from_store(history_store)
+            play_history_version = version
+    return play_history
+
 def background_updater():
     """Background thread to update song data periodically"""
-    global latest_song_data
+    global last_checked
+    
+    if song_snapshot is None:
+        # Join the startup fetch (or a cold request's) instead of repeating it
+        try:
+            initial_fetch.run(fetch_initial_song, None)
+        except Exception as e:
+            print(f"❌ Update error: {e}")
     
     while True:
+        item = None
+        changed = False
         try:
-            # Try to get real-time data first
-            new_data = get_recently_played()
+            # Cheap check first: only the recently-played call
+            item = get_latest_play()
             
-            if new_data:
-                # Check if it's a new song
-                if (latest_song_data is None or 
-                    latest_song_data.get('song_name') != new_data.get('song_name') or
-                    latest_song_data.get('played_at') != new_data.get('played_at')):
-                    latest_song_data = new_data
+            if item and song_snapshot is not None and play_key(item) == last_play_key:
+                # Same song - the payload (and its ETag) stay as they are
+                last_checked = datetime.now().isoformat()
+            elif item:
+                # Something changed - now pay for the enrichment calls
+                new_data = get_enhanced_track_details(item['track']['id'], item['played_at'], play_artist_ids(item))
+                if new_data:
+                    set_latest_song(new_data, play_key(item))
+                    changed = True
+                    # Also catch any plays that happened between two polls
+                    ingest_history()
                     print(f"🎵 New song: {new_data['song_name']} by {new_data['artist']}")
-                else:
-                    # Same song, just update timestamp
-                    if latest_song_data:
-                        latest_song_data['last_updated'] = datetime.now().isoformat()
             else:
                 # Fallback to static data if real-time fails
-                if latest_song_data is None:
+                if song_snapshot is None:
                     static_data = get_enhanced_song_info_fallback()
                     if static_data and 'error' not in static_data:
-                        latest_song_data = static_data
-                        latest_song_data['last_updated'] = datetime.now().isoformat()
+                        static_data['last_updated'] = datetime.now().isoformat()
+                        set_latest_song(static_data)
                         print(f"🎵 Using saved song: {static_data['song_name']} by {static_data['artist']}")
                         
         except Exception as e:
             print(f"❌ Update error: {e}")
         
-        # Wait 30 seconds before next update
-        time.sleep(30)
+        # Sleep through the current track, poll fast near its end, back off when idle
+        if item:
+            interval = poll_scheduler.next_interval(item['played_at'], item['track']['duration_ms'], changed)
+        else:
+            interval = poll_scheduler.next_interval(changed=changed)
+        time.sleep(interval)
+
 def get_spotify_token():
-    """Get Spotify access token using client credentials flow"""
-    auth_string = f"{CLIENT_ID}:{CLIENT_SECRET}"
-    auth_bytes = auth_string.encode('ascii')
-    auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-    
-    headers = {
-        'Authorization': f'Basic {auth_b64}',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
-    
-    data = {'grant_type': 'client_credentials'}
-    
-    response = requests.post('https://accounts.spotify.com/api/token', headers=headers, data=data)
-    
-    if response.status_code == 200:
-        return response.json()['access_token']
-    return None
+    """Get Spotify access token using client credentials flow (cached in memory)"""
+    return client_token.get()
 
 def get_enhanced_song_info_fallback():
     """Fallback to get song info from saved file"""
@@ -206,10 +357,9 @@ def get_enhanced_song_info_fallback():
 
 def get_enhanced_song_info(access_token):
     """Legacy function - now redirects to real-time data"""
-    global latest_song_data
-    
-    if latest_song_data:
-        return latest_song_data
+    snapshot = song_snapshot
+    if snapshot:
+        return snapshot.to_dict()
     else:
         return get_enhanced_song_info_fallback()
 
@@ -218,50 +368,183 @@ def index():
     """Serve the main page"""
     return render_template('index.html')
 
+def fetch_initial_song():
+    """Fetch the first song after startup; returns the song or an error dict"""
+    key = None
+    item = get_latest_play()
+    initial_data = None
+    if item:
+        key = play_key(item)
+        initial_data = get_enhanced_track_details(item['track']['id'], item['played_at'], play_artist_ids(item))
+    
+    if initial_data is None:
+        # Fallback to saved data - not the current play, so it mustn't carry its key
+        key = None
+        token = get_spotify_token()
+        if not token:
+            return {"error": "Failed to authenticate with Spotify"}
+        fallback_data = get_enhanced_song_info_fallback()
+        if not fallback_data or 'error' in fallback_data:
+            return {"error": "No song data available. Please run authentication and play some music."}
+        fallback_data['last_updated'] = datetime.now().isoformat()
+        initial_data = fallback_data
+    
+    set_latest_song(initial_data, key)
+    return initial_data
+
 @app.route('/api/last-song')
 def api_last_song():
     """API endpoint to get real-time last song data"""
-    global latest_song_data
-    
-    if latest_song_data is None:
-        # Try to get initial data
-        latest_song_data = get_recently_played()
+    if song_snapshot is None:
+        # Every concurrent cold request shares one upstream fetch
+        finished, result = initial_fetch.run(fetch_initial_song, COLD_START_DEADLINE)
         
-        if latest_song_data is None:
-            # Fallback to saved data
-            token = get_spotify_token()
-            if token:
-                fallback_data = get_enhanced_song_info_fallback()
-                if fallback_data and 'error' not in fallback_data:
-                    latest_song_data = fallback_data
-                    latest_song_data['last_updated'] = datetime.now().isoformat()
-                else:
-                    return jsonify({"error": "No song data available. Please run authentication and play some music."})
-            else:
-                return jsonify({"error": "Failed to authenticate with Spotify"})
+        if not finished:
+            response = jsonify({"status": "warming_up", "retry_after": WARMING_UP_RETRY_AFTER})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(WARMING_UP_RETRY_AFTER)
+            return response
+        if result is None or 'error' in result:
+            return jsonify(result or {"error": "No song data available."})
     
-    return jsonify(latest_song_data)
+    snapshot = song_snapshot
+    return conditional_json(snapshot.body, snapshot.etag)
+
+# Embeds may show a badge this many seconds old
+BADGE_MAX_AGE = 60
+
+@app.route('/badge.svg')
+def now_playing_badge():
+    """Small SVG badge of the current song for READMEs and profiles (?theme=dark|light|cover)"""
+    snapshot = song_snapshot
+    body, etag = badge_cache.get(snapshot.data if snapshot else None, request.args.get('theme', DEFAULT_THEME))
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='image/svg+xml')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={BADGE_MAX_AGE}'
+    return response
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events stream that pushes a message whenever the song changes"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(
+        song_events.stream(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/recent')
+def api_recent():
+    """The most recent plays from the local history, newest first"""
+    limit = max(1, min(request.args.get('limit', 20, type=int), 500))
+    history = sync_play_history()
+    
+    plays = history.recent(limit)
+    for play in plays:
+        play['played_at'] = ms_to_iso(play['played_at_ms'])
+    return jsonify({"total": len(history), "plays": plays})
+
+@app.route('/api/stats')
+def api_stats():
+    """Top tracks, artists, genres and listening time for a time window"""
+    window = request.args.get('window', DEFAULT_WINDOW)
+    if window not in WINDOWS:
+        response = jsonify({"error": f"Unknown window. Use one of: {', '.join(WINDOWS)}"})
+        response.status_code = 400
+        return response
+    limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), 50))
+    
+    stats = stats_engine.get(window, limit)
+    body = json.dumps(stats, separators=(',', ':')).encode('utf-8')
+    return conditional_json(body, make_etag(body))
+
+@app.route('/api/analytics')
+def api_analytics():
+    """Listening heatmap, streaks, genre time share and skip rate over the whole history"""
+    if history_analytics is None:
+        response = jsonify({"error": "Analytics need numpy (pip install numpy)"})
+        response.status_code = 501
+        return response
+    tz_offset = max(-14 * 60, min(request.args.get('tz_offset', 0, type=int), 14 * 60))
+    
+    history = sync_play_history()
+    now_ms = int(time.time() * 1000)
+    # Streaks depend on the current day, so that is part of the key too
+    key = (play_history_version, tz_offset, (now_ms + tz_offset * 60000) // history_analytics.DAY_MS)
+    body = analytics_cache.get(key)
+    if body is None:
+        analytics = history_analytics.analyze(history, tz_offset, today_ms=now_ms)
+        body = json.dumps(analytics, separators=(',', ':')).encode('utf-8')
+        if len(analytics_cache) > 32:
+            analytics_cache.clear()
+        analytics_cache[key] = body
+    return conditional_json(body, make_etag(body))
+
+# Covers never change for an album id and size, so browsers may keep them for a year
+ART_MAX_AGE = 365 * 24 * 60 * 60
+
+@app.route('/art/<album_id>')
+def album_art(album_id):
+    """Album cover, resized and cached locally (size in px, rounded up to a served size)"""
+    size = max(1, min(request.args.get('size', THUMBNAIL_SIZES[-1], type=int), THUMBNAIL_SIZES[-1]))
+    
+    # Only albums the server has already seen are served; unknown ids never reach Spotify
+    album = album_cache.get(album_id) if ALBUM_ID.match(album_id) else None
+    path = album_art_cache.get(album_id, size, (album or {}).get('images'))
+    if path is None:
+        response = jsonify({"error": "Cover not available"})
+        response.status_code = 404
+        return response
+    
+    # The file name (album id and size) identifies the content; mtime only tracks LRU order
+    response = send_file(path, mimetype='image/jpeg', max_age=ART_MAX_AGE, conditional=True,
+                         etag=os.path.basename(path))
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/api/status')
 def api_status():
     """Get update status and connection info"""
-    global user_access_token, latest_song_data
+    is_connected = user_token.is_valid() or user_token.can_refresh()
     
-    is_connected = user_access_token is not None and time.time() < token_expires_at
-    
-    return jsonify({
+    status = {
         "real_time_connected": is_connected,
-        "has_data": latest_song_data is not None,
-        "token_expires_at": token_expires_at if is_connected else None,
-        "last_update": latest_song_data.get('last_updated') if latest_song_data else None,
-        "update_interval": "30 seconds",
-        "mode": "real-time" if is_connected else "static"
-    })
+        "has_data": song_snapshot is not None,
+        "token_expires_at": user_token.expires_at if is_connected else None,
+        "last_update": last_checked,
+        "update_interval": f"{poll_scheduler.interval:.0f} seconds",
+        "poll_schedule": poll_scheduler.stats(),
+        "stream_subscribers": song_events.subscribers,
+        "mode": "real-time" if is_connected else "static",
+        "metadata_cache": cache_stats(),
+        "album_art": album_art_cache.stats(),
+        "badges": badge_cache.stats(),
+        "play_history": play_history.stats(),
+        "rate_limit": spotify_api.rate_limiter.stats()
+    }
+    body = json.dumps(status, separators=(',', ':')).encode('utf-8')
+    return conditional_json(body, make_etag(body))
 
 if __name__ == '__main__':
     # Create templates directory
     os.makedirs('templates', exist_ok=True)
     
+    # Save the snapshot on normal exit and on SIGTERM
+    atexit.register(persist_snapshot)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # Warm start: serve the last known song right away
+    if load_persisted_snapshot():
+        print(f"♻️ Restored last song: {song_snapshot.get('song_name')} by {song_snapshot.get('artist')}")
+    
+    # Load the play history into memory without delaying startup
+    threading.Thread(target=sync_play_history, daemon=True).start()
+    
     # Try to load user authentication token
     has_user_token = load_saved_token()
     
@@ -271,10 +554,16 @@ if __name__ == '__main__':
         updater_thread = threading.Thread(target=background_updater, daemon=True)
         updater_thread.start()
         
-        # Get initial data
-        latest_song_data = get_recently_played()
-        if latest_song_data:
-            print(f"🎵 Currently playing: {latest_song_data['song_name']} by {latest_song_data['artist']}")
+        # Get initial data (the updater refreshes a restored snapshot in the background)
+        if song_snapshot is None:
+            try:
+                # Shared with the updater and any cold /api/last-song request
+                finished, initial_data = initial_fetch.run(fetch_initial_song, COLD_START_DEADLINE)
+            except Exception as e:
+                print(f"❌ Initial fetch error: {e}")
+                finished, initial_data = False, None
+            if finished and initial_data and 'error' not in initial_data:
+                print(f"🎵 Currently playing: {initial_data['song_name']} by {initial_data['artist']}")
     else:
         print("⚠️ No user authentication - using static mode")
         print("💡 Run 'python manual_auth.py' for real-time updates")
@@ -284,14 +573,14 @@ if __name__ == '__main__':
         print(f"🌐 Starting web server...")
         print(f"🔗 Open: https://{CODESPACE_NAME}-5000.app.github.dev/")
         if has_user_token:
-            print(f"🔄 Real-time updates every 30 seconds")
+            print(f"🔄 Real-time updates on an adaptive schedule")
         else:
             print(f"📊 Static mode - shows last saved song")
         app.run(host='0.0.0.0', port=5000, debug=False)
     else:
         print("🌐 Starting web server at http://localhost:5000")
         if has_user_token:
-            print("🔄 Real-time updates every 30 seconds")
+            print("🔄 Real-time updates on an adaptive schedule")
         else:
             print("📊 Static mode - shows last saved song")
         app.run(host='0.0.0.0', port=5000, debug=False)